@@ -6,15 +6,32 @@ This module contains helpful classes and function for creating SVG files.
 __version__ = '0.1'
 __author__ = 'Andreas Lehn <andreas.lehn@icloud.com>'
 
+import io
+import os
+import re
+import math
+import gzip
+import secrets
+import argparse
+import contextlib
+from array import array
 import numpy as np
 import xml.etree.ElementTree as etree
 
 IMAGE_SIZE_DEFAULT = 150
+WRITE_BUFFER_SIZE = 64 * 1024
+COMPRESSLEVEL_DEFAULT = 9
+INSTANCING_MIN_LENGTH = 64 # shorter path data is not worth a use element
+XLINK_NAMESPACE = 'http://www.w3.org/1999/xlink'
 
 class Image(etree.Element):
 
-    def __init__(self, size=(IMAGE_SIZE_DEFAULT, IMAGE_SIZE_DEFAULT), center=None, attrib={}, **extra):
+    def __init__(self, size=(IMAGE_SIZE_DEFAULT, IMAGE_SIZE_DEFAULT), center=None, attrib={}, output_format=None, instancing=False, **extra):
         super().__init__('svg', {'xmlns': 'http://www.w3.org/2000/svg', 'version': '1.1', **attrib}, **extra)
+        self.output_format = output_format
+        self.instancing = instancing
+        self.defs = None
+        self._definitions = {}
         if center is None:
             center = (0, size[1])
         self.resize(size, center)
@@ -34,10 +51,463 @@ class Image(etree.Element):
         self._cx, self._cy = center
         self.set('viewBox', f'{fmt_f(-self._cx, -self._cy, self._width, self._height)}')
 
-    def write(self, file):
-        tree = etree.ElementTree(self)
-        etree.indent(tree, '    ')
-        tree.write(file, encoding='unicode')
+    def define(self, elem):
+        '''Puts an element into the defs section of the image and returns the reference to it
+
+        The reference, e.g. '#path1', is used by Use elements.
+        An element that is identical to an element defined before is not stored again,
+        the reference of the first one is returned.
+        '''
+        key = _element_key(elem)
+        ref = self._definitions.get(key)
+        if ref is None:
+            if self.defs is None:
+                self.set('xmlns:xlink', XLINK_NAMESPACE)
+                self.defs = etree.Element('defs')
+                self.insert(list(self).index(self.content), self.defs)
+            ref = f'#{elem.tag}{len(self._definitions) + 1}'
+            attrib = dict(elem.attrib)
+            elem.attrib.clear()
+            elem.attrib.update({'id': ref[1:], **attrib})
+            self.defs.append(elem)
+            self._definitions[key] = ref
+        return ref
+
+    def deduplicate(self, min_count=2, min_length=INSTANCING_MIN_LENGTH):
+        '''Replaces path elements with the same path data by use elements of one definition
+
+        Only path data of at least min_length characters that occurs min_count times is replaced.
+        The other attributes stay at the use element, the definition has only the path data.
+        Path data given as PathData is not considered. Returns the number of replaced elements.
+        '''
+        groups = {}
+        for elem in self.content.iter('path'):
+            d = elem.get('d')
+            if isinstance(d, str) and len(d) >= min_length:
+                groups.setdefault(d, []).append(elem)
+        count = 0
+        for d, elems in groups.items():
+            if len(elems) < min_count:
+                continue
+            ref = self.define(etree.Element('path', {'d': d}))
+            for elem in elems:
+                attrib = {key: value for key, value in elem.items() if key != 'd'}
+                elem.tag = 'use'
+                elem.attrib.clear()
+                elem.attrib.update({'xlink:href': ref, **attrib})
+            count += len(elems)
+        return count
+
+    def write(self, file, indent='    ', buffer_size=WRITE_BUFFER_SIZE, output_format=None, compresslevel=COMPRESSLEVEL_DEFAULT):
+        '''Writes the image to a file name, a path-like object or a text or binary file object
+
+        The tree is walked once and written through a buffer of buffer_size characters.
+        Path data given as PathData is generated piece by piece while it is written.
+        With indent=None the image is written without any pretty printing.
+        output_format replaces the OutputFormat of the image for this call.
+        A file name with the extension .svgz is written through a gzip compressor with compresslevel.
+        A file is written under a temporary name first and replaces the file only if the image is complete (see replacing).
+        If instancing is set, repeated path data is replaced by use elements before (see deduplicate).
+        '''
+        if self.instancing:
+            self.deduplicate()
+        if isinstance(file, (str, bytes, os.PathLike)):
+            file = os.fsdecode(file)
+            with replacing(file) as tmp:
+                if file.lower().endswith('.svgz'):
+                    # mtime=0 makes the output reproducible, the header contains the name of the file, not of tmp
+                    with open(tmp, 'wb') as raw, gzip.GzipFile(file, 'wb', compresslevel, raw, mtime=0) as f:
+                        self.write(f, indent, buffer_size, output_format)
+                else:
+                    with open(tmp, 'w', encoding='utf-8', errors='xmlcharrefreplace') as f:
+                        self.write(f, indent, buffer_size, output_format)
+            return
+        output_format = output_format or self.output_format
+        if output_format is not None and output_format.minify:
+            indent = None
+        if isinstance(file, (io.RawIOBase, io.BufferedIOBase)):
+            def write(text):
+                file.write(text.encode('utf-8', 'xmlcharrefreplace'))
+        else:
+            write = file.write
+        writer = _BufferedWriter(write, buffer_size)
+        _write_element(writer.write, self, 0, indent, output_format)
+        writer.flush()
+
+@contextlib.contextmanager
+def replacing(filename):
+    '''yields the name of a temporary file that replaces the file filename if the block succeeds
+
+    The temporary file is in the same directory, so the file is replaced in one step:
+    readers never see a partly written file, and after an error the old file is kept.
+    A symbolic link is followed, a special file like /dev/stdout is written directly.
+    '''
+    if os.path.exists(filename) and not os.path.isfile(filename):
+        yield filename
+        return
+    target = os.path.realpath(filename)
+    directory, name = os.path.split(target)
+    tmp = os.path.join(directory, f'.{name}.{secrets.token_hex(4)}.tmp')
+    try:
+        yield tmp
+        os.replace(tmp, target)
+    except BaseException:
+        with contextlib.suppress(FileNotFoundError):
+            os.unlink(tmp)
+        raise
+
+class OutputFormat:
+    '''Output profile of an image
+
+    precision: number of decimals of path data and coordinate attributes,
+               values are rounded from the text of the elements,
+               so precisions above 3 do not add any digits
+    relative:  write path data with relative commands
+    minify:    drop whitespace, repeated command letters and unneeded zeros
+    '''
+
+    NUMERIC_ATTRIBUTES = { 'x', 'y', 'x1', 'y1', 'x2', 'y2', 'cx', 'cy', 'r', 'rx', 'ry' }
+
+    def __init__(self, precision=3, relative=False, minify=False):
+        if precision < 0:
+            raise ValueError(f'precision must not be negative: {precision}')
+        self.precision = precision
+        self.relative = relative
+        self.minify = minify
+
+    def params(self):
+        '''returns the settings as dict, e.g. as key of a cache'''
+        return { 'precision': self.precision, 'relative': self.relative, 'minify': self.minify }
+
+    @classmethod
+    def create(cls, compact=False, precision=None):
+        '''returns the OutputFormat for the command line options --compact and --precision or None for the default output'''
+        if not compact and precision is None:
+            return None
+        if precision is None:
+            precision = COMPACT_FORMAT.precision
+        return cls(precision, relative=compact, minify=compact)
+
+    @staticmethod
+    def precision_option(text):
+        '''argparse type of the option --precision'''
+        precision = int(text)
+        if precision < 0:
+            raise argparse.ArgumentTypeError(f'must not be negative: {precision}')
+        return precision
+
+    def number(self, value):
+        '''formats a number'''
+        text = f'{value:.{self.precision}f}'
+        if not self.minify:
+            return text
+        text = _trim_zeros(text)
+        if text.startswith('0.'):
+            return text[1:]
+        if text.startswith('-0.'):
+            return '-' + text[2:]
+        return text
+
+    def attribute(self, key, value):
+        '''formats the value of an attribute'''
+        if key in self.NUMERIC_ATTRIBUTES:
+            try:
+                return self.number(float(value))
+            except ValueError:
+                pass
+        return value
+
+    def path(self, chunks):
+        '''yields the path data of chunks in this format
+
+        chunks is a string or an iterable of strings.
+        A string that is no valid path data is passed unchanged,
+        invalid path data of an iterable raises a ValueError.
+        '''
+        if isinstance(chunks, str):
+            try:
+                return [''.join(_PathFormatter(self).chunks([chunks]))]
+            except ValueError:
+                return [chunks]
+        return _PathFormatter(self).chunks(chunks)
+
+COMPACT_FORMAT = OutputFormat(precision=2, relative=True, minify=True)
+
+# a command letter, a number or any other character except separators, which is an error
+_PATH_TOKEN = re.compile(r'[A-Za-z]|[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?|[^\s,]')
+_NUMBER_CHARACTERS = '0123456789.eE+-'
+
+class _PathFormatter:
+    '''Rewrites path data in an OutputFormat
+
+    Relative coordinates are calculated from the rounded coordinates written before,
+    so the rounding errors do not add up along the path.
+    '''
+
+    def __init__(self, output_format):
+        self.format = output_format
+        self.command = None   # command of the input
+        self.count = 0        # number of arguments of the command
+        self.args = []
+        self.written = None   # last command letter written
+        self.last = ''        # last text written, to decide about separators
+        self.x = self.y = 0.0 # current point of the input
+        self.sx = self.sy = 0.0 # start point of the sub path in the input
+        self.wx = self.wy = 0.0 # current point as written
+        self.wsx = self.wsy = 0.0 # start point of the sub path as written
+
+    def chunks(self, chunks):
+        pending = ''
+        for chunk in chunks:
+            text = pending + chunk
+            pending = ''
+            # the last number may continue in the next chunk
+            head = text.rstrip(_NUMBER_CHARACTERS)
+            text, pending = head, text[len(head):]
+            out = []
+            for token in _PATH_TOKEN.findall(text):
+                self.token(token, out)
+            yield ''.join(out)
+        out = []
+        for token in _PATH_TOKEN.findall(pending):
+            self.token(token, out)
+        if self.args:
+            raise ValueError(f'incomplete path command {self.command}')
+        yield ''.join(out)
+
+    def token(self, token, out):
+        if token.isalpha():
+            if token.upper() not in PATH_COMMANDS:
+                raise ValueError(f'unknown path command {token}')
+            if self.args:
+                raise ValueError(f'incomplete path command {self.command}')
+            self.command = token
+            self.count = PATH_COMMANDS[token.upper()]
+            if token in 'Zz':
+                self.segment(out)
+            return
+        if not self.count:
+            raise ValueError(f'number {token} without path command')
+        self.args.append(float(token))
+        if len(self.args) == self.count:
+            self.segment(out)
+            self.args = []
+            if self.command in 'Mm':
+                self.command = 'L' if self.command == 'M' else 'l'
+
+    def segment(self, out):
+        command, args = self.command, self.args
+        upper = command.upper()
+        if upper == 'Z':
+            self.x, self.y = self.sx, self.sy
+        elif upper == 'H':
+            if command.islower():
+                args[0] += self.x
+            self.x = args[0]
+        elif upper == 'V':
+            if command.islower():
+                args[0] += self.y
+            self.y = args[0]
+        else:
+            if command.islower():
+                # make the input absolute
+                for i in range(len(args) - 2 if upper == 'A' else 0, len(args), 2):
+                    args[i] += self.x
+                    args[i + 1] += self.y
+            self.x, self.y = args[-2], args[-1]
+            if upper == 'M':
+                self.sx, self.sy = self.x, self.y
+        self.emit(upper, args, out)
+
+    def emit(self, command, args, out):
+        fmt = self.format
+        if fmt.relative:
+            command = command.lower()
+        values = list(args)
+        if command in 'Zz':
+            self.wx, self.wy = self.wsx, self.wsy
+        elif command in 'HhVv':
+            horizontal = command in 'Hh'
+            origin = self.wx if horizontal else self.wy
+            values = [float(fmt.number(args[0] - origin if fmt.relative else args[0]))]
+            end = origin + values[0] if fmt.relative else values[0]
+            if horizontal:
+                self.wx = end
+            else:
+                self.wy = end
+        elif fmt.relative:
+            first = len(args) - 2 if command == 'a' else 0
+            for i in range(first, len(args), 2):
+                values[i] = args[i] - self.wx
+                values[i + 1] = args[i + 1] - self.wy
+            values = [float(fmt.number(v)) for v in values]
+            self.wx, self.wy = self.wx + values[-2], self.wy + values[-1]
+        else:
+            values = [float(fmt.number(v)) for v in args]
+            self.wx, self.wy = values[-2], values[-1]
+        if command in 'Mm':
+            self.wsx, self.wsy = self.wx, self.wy
+        # a moveto after a moveto needs its letter, repeated pairs would be read as lineto
+        implicit = (self.written == command and command not in 'Mm') \
+            or (self.written, command) in (('M', 'L'), ('m', 'l'))
+        if not (fmt.minify and implicit and command not in 'Zz'):
+            self.write(command, out)
+        self.written = command
+        texts = [fmt.number(v) for v in values]
+        if command in 'Aa':
+            # rotation and flags
+            texts[2:5] = [str(int(v)) if v == int(v) else fmt.number(v) for v in args[2:5]]
+        for text in texts:
+            self.write(text, out)
+
+    def write(self, text, out):
+        if not self.format.minify:
+            out.append(text if not self.last else ' ' + text)
+        elif self.last and not self.last[-1].isalpha() and not text[0].isalpha() and text[0] != '-' \
+                and not (text[0] == '.' and '.' in self.last):
+            out.append(' ' + text)
+        else:
+            out.append(text)
+        self.last = text
+
+class PathData:
+    '''Path data that is created piece by piece while an image is written
+
+    factory is called without arguments and must return an iterable of strings
+    that are concatenated to the value of the d attribute.
+    '''
+
+    def __init__(self, factory):
+        self.factory = factory
+
+    def __iter__(self):
+        return iter(self.factory())
+
+    def __str__(self):
+        return ''.join(self)
+
+class ElementStream(etree.Element):
+    '''Placeholder of elements that are created while an image is written
+
+    factory is called with the ElementStream as argument and must return an iterable.
+    At each step of the iteration it adds elements to the ElementStream, e.g. with Path(stream, ...).
+    They are written in place of the ElementStream and removed before the next step,
+    so the elements of a large image are never in memory at once.
+    '''
+
+    def __init__(self, factory):
+        super().__init__('stream')
+        self.factory = factory
+
+def _write_stream(write, stream, level, indent, output_format=None):
+    separator = '\n' + indent * level if indent is not None else ''
+    first = True
+    for _ in stream.factory(stream):
+        for elem in stream:
+            if not first:
+                write(separator)
+            _write_element(write, elem, level, indent, output_format)
+            first = False
+        del stream[:]
+
+class _BufferedWriter:
+    '''Collects small strings and passes them in pieces of about buffer_size characters to write'''
+
+    def __init__(self, write, buffer_size):
+        self._write = write
+        self.buffer_size = buffer_size
+        self.parts = []
+        self.size = 0
+
+    def write(self, text):
+        self.parts.append(text)
+        self.size += len(text)
+        if self.size >= self.buffer_size:
+            self.flush()
+
+    def flush(self):
+        if self.parts:
+            self._write(''.join(self.parts))
+        self.parts = []
+        self.size = 0
+
+_ATTRIB_SPECIAL = re.compile('[&<>"\r\n\t]')
+
+def _escape_cdata(text):
+    return text.replace('&', '&amp;').replace('<', '&lt;').replace('>', '&gt;')
+
+def _escape_attrib(text):
+    text = _escape_cdata(text).replace('"', '&quot;')
+    return text.replace('\r', '&#13;').replace('\n', '&#10;').replace('\t', '&#09;')
+
+def _element_key(elem):
+    '''returns a hashable key of an element with its attributes and children'''
+    return (elem.tag, tuple(sorted((key, str(value)) for key, value in elem.items() if key != 'id')),
+            elem.text, tuple(_element_key(child) for child in elem))
+
+def _start_tag(elem):
+    '''returns the start tag of an element without the closing bracket
+
+    Returns None if a value is not a str, e.g. PathData that is written piece by piece.
+    '''
+    try:
+        return '<' + elem.tag + ''.join([f' {key}="{value}"' if _ATTRIB_SPECIAL.search(value) is None else f' {key}="{_escape_attrib(value)}"'
+                                         for key, value in elem.items()])
+    except TypeError:
+        return None
+
+def _write_start_tag(write, elem, output_format=None):
+    '''writes the start tag of an element without the closing bracket, value by value'''
+    write('<' + elem.tag)
+    for key, value in elem.items():
+        write(f' {key}="')
+        if output_format is not None:
+            if key == 'd':
+                value = PathData(lambda value=value: output_format.path(value))
+            else:
+                value = output_format.attribute(key, value)
+        if isinstance(value, PathData):
+            for chunk in value:
+                write(_escape_attrib(chunk))
+        else:
+            write(_escape_attrib(value))
+        write('"')
+
+def _write_element(write, elem, level, indent, output_format=None):
+    '''Writes an element and its children in the same layout as etree.indent
+
+    If indent is None the whitespace of the tree is written unchanged.
+    '''
+    start = _start_tag(elem) if output_format is None else None
+    if start is None:
+        _write_start_tag(write, elem, output_format)
+        start = ''
+    text = elem.text
+    if len(elem):
+        if indent is not None:
+            inner = '\n' + indent * (level + 1)
+            outer = '\n' + indent * level
+            if not text or not text.strip():
+                text = inner
+        write(start + '>' + _escape_cdata(text) if text else start + '>')
+        last = len(elem) - 1
+        for i, child in enumerate(elem):
+            if isinstance(child, ElementStream):
+                _write_stream(write, child, level + 1, indent, output_format)
+            else:
+                _write_element(write, child, level + 1, indent, output_format)
+            tail = child.tail
+            if indent is not None and (not tail or not tail.strip()):
+                write(inner if i < last else outer)
+            elif tail:
+                write(_escape_cdata(tail))
+        write(f'</{elem.tag}>')
+    elif text:
+        write(start + '>' + _escape_cdata(text) + f'</{elem.tag}>')
+    elif output_format is not None and output_format.minify:
+        write(start + '/>')
+    else:
+        write(start + ' />')
 
 def Point(x, y):
     '''Create a Point object'''
@@ -57,6 +527,8 @@ def cart2pol(p):
 
 def pol2cart(r, phi):
     '''Convert a point from polar coordinate system to cartesian coordinate system'''
+    if isinstance(phi, (int, float)):
+        return Point(r * math.cos(phi), r * math.sin(phi))
     return Point(r * np.cos(phi), r * np.sin(phi))
 
 def orth(p):
@@ -67,9 +539,32 @@ def orth(p):
 def norm_angle(alpha):
     '''Returns an angle equivalent to alpha in the interval [0, 2 * PI)'''
     U = 2 * np.pi
-    n = np.floor(alpha / U)
+    n = math.floor(alpha / U) if isinstance(alpha, (int, float)) else np.floor(alpha / U)
     return alpha - n * U
 
+# Skalare Varianten der Hilfsfunktionen: Punkte sind hier einfache Tupel (x, y).
+# Sie erzeugen keine NumPy-Arrays und liefern dieselben Werte wie die Array-Varianten.
+
+def pol2xy(r, phi):
+    '''Convert polar coordinates to the cartesian tuple (x, y)'''
+    return r * math.cos(phi), r * math.sin(phi)
+
+def length_xy(x, y):
+    '''Calculate the length of the vector (x, y)'''
+    return math.sqrt(x**2 + y**2)
+
+def distance_xy(x0, y0, x1, y1):
+    '''Calculate the distance between the points (x0, y0) and (x1, y1)'''
+    return math.sqrt((x0 - x1)**2 + (y0 - y1)**2)
+
+def angle_xy(x, y):
+    '''Calculate the angle of the vector (x, y)'''
+    return np.arctan2(y, x) # math.atan2 rundet anders als np.arctan2
+
+def orth_xy(x, y):
+    '''Calculate the orthogonal vector of (x, y)'''
+    return -y, x
+
 def fmt_f(f, *floats):
     '''Format floats for output in SVG file'''
     result = f'{f:.3f}'
@@ -77,6 +572,31 @@ def fmt_f(f, *floats):
         result += f' {f:.3f}'
     return result
 
+def fmt_values(values, precision=3, trim=False):
+    '''Format all values of an array for output in SVG file, returns a list of strings
+
+    Meant for large arrays, a few scalars are formatted faster with fmt_f.
+    With the default precision the strings are identical to the output of fmt_f.
+    With trim trailing zeros and a trailing decimal point are removed.
+    '''
+    values = np.asarray(values, dtype=float).ravel().tolist()
+    result = ((f'%.{int(precision)}f ' * len(values)) % tuple(values)).split()
+    if trim:
+        result = list(map(_trim_zeros, result))
+    return result
+
+def fmt_array(values, precision=3, trim=False, sep=' '):
+    '''Format all values of an array for output in SVG file in one call'''
+    if trim or sep != ' ':
+        return sep.join(fmt_values(values, precision, trim))
+    values = np.asarray(values, dtype=float).ravel().tolist()
+    return ((f'%.{int(precision)}f ' * len(values)) % tuple(values))[:-1]
+
+def _trim_zeros(text):
+    if '.' in text:
+        text = text.rstrip('0').rstrip('.')
+    return '0' if text == '-0' else text
+
 def angle(p):
     '''Calculate the angle of a vector'''
     return np.arctan2(p[1], p[0])
@@ -109,6 +629,20 @@ def Path(parent, d, attrib={}, **extra):
     '''Create a SVG path element'''
     return etree.SubElement(parent, 'path', {'d': d, 'fill': 'lightgrey', **THICK_STROKE, **attrib }, **extra)
 
+def Use(parent, ref, pos=None, rotation=0, attrib={}, **extra):
+    '''Create an SVG use element of a definition, see Image.define
+
+    The definition is rotated by rotation and then moved to pos.
+    '''
+    transform = []
+    if pos is not None:
+        transform.append(f'translate({fmt_f(*pos)})')
+    if rotation:
+        transform.append(f'rotate({fmt_f(degrees(rotation))})')
+    if transform:
+        attrib = {'transform': ' '.join(transform), **attrib}
+    return etree.SubElement(parent, 'use', {'xlink:href': ref, **attrib}, **extra)
+
 def Translation(parent, origin, attrib={}, **extra):
     return etree.SubElement(parent, 'g', {'transform': f'translate({fmt_f(*origin)}', **attrib }, **extra)
 
@@ -151,34 +685,190 @@ def RightAngleSymbol(parent, pos, rotation, attrib={}, clockwise=False, **extra)
     Dot(g, pos + (v1 + v2) / 2 / np.sqrt(2))
     return result
 
+PARALLEL_TOLERANCE = 1e-12 # lines with |sin(alpha1 - alpha0)| below this value are parallel
+
 def intersection_r(x0, y0, alpha0, x1, y1, alpha1):
-    '''returns the intersection point of two lines'''
-    dx0, dy0 = pol2cart(1, alpha0)
-    dx1, dy1 = pol2cart(1, alpha1)
+    '''returns the distances r0 and r1 of the intersection point of two lines from their start points
+
+    The line i starts at (xi, yi) in direction alphai.
+    Raises ValueError if the lines are parallel.
+    '''
+    dx0, dy0 = pol2xy(1, alpha0)
+    dx1, dy1 = pol2xy(1, alpha1)
     '''
     x0 + r0 * dx0 = x1 + r1 * dx1
     y0 + r0 * dy0 = y1 + r1 * dy1
     -----------------------------
     r0 * dx0 - r1 * dx1 = x1 - x0
     r0 * dy0 - r1 * dy1 = y1 - y0
+    -----------------------------
+    gelöst mit der Cramerschen Regel
     '''
-    a = np.array([[dx0, -dx1], [dy0, -dy1]])
-    b = np.array([x1 - x0, y1 - y0])
-    return np.linalg.solve(a, b)
+    det = dx1 * dy0 - dx0 * dy1
+    if abs(det) < PARALLEL_TOLERANCE:
+        raise ValueError(f'lines with the angles {alpha0} and {alpha1} are parallel')
+    bx, by = x1 - x0, y1 - y0
+    return (dx1 * by - bx * dy1) / det, (dx0 * by - bx * dy0) / det
+
+def intersections_r(x0, y0, alpha0, x1, y1, alpha1):
+    '''vectorized version of intersection_r for arrays of lines
+
+    All arguments are broadcast against each other.
+    Returns the arrays r0 and r1, which are NaN for parallel lines.
+    '''
+    alpha0, alpha1 = np.asarray(alpha0, dtype=float), np.asarray(alpha1, dtype=float)
+    dx0, dy0 = np.cos(alpha0), np.sin(alpha0)
+    dx1, dy1 = np.cos(alpha1), np.sin(alpha1)
+    det = dx1 * dy0 - dx0 * dy1
+    det = np.where(np.abs(det) < PARALLEL_TOLERANCE, np.nan, det)
+    bx, by = np.subtract(x1, x0), np.subtract(y1, y0)
+    return (dx1 * by - bx * dy1) / det, (dx0 * by - bx * dy0) / det
 
 def intersection_point(x0, y0, alpha0, x1, y1, alpha1):
+    return np.array(intersection_xy(x0, y0, alpha0, x1, y1, alpha1))
+
+def intersection_xy(x0, y0, alpha0, x1, y1, alpha1):
+    '''returns the intersection point of two lines as tuple (x, y)'''
     r0, _ = intersection_r(x0, y0, alpha0, x1, y1, alpha1)
-    return np.array([x0, y0]) + pol2cart(r0, alpha0)
+    dx, dy = pol2xy(r0, alpha0)
+    return x0 + dx, y0 + dy
+
+def intersection_points(x0, y0, alpha0, x1, y1, alpha1):
+    '''vectorized version of intersection_point, returns an array of shape (..., 2)
+
+    The points of parallel lines are NaN.
+    '''
+    r0, _ = intersections_r(x0, y0, alpha0, x1, y1, alpha1)
+    alpha0 = np.asarray(alpha0, dtype=float)
+    return np.stack((x0 + r0 * np.cos(alpha0), y0 + r0 * np.sin(alpha0)), axis=-1)
+
+PATH_COMMANDS = { 'M': 2, 'L': 2, 'H': 1, 'V': 1, 'C': 6, 'S': 4, 'Q': 4, 'T': 2, 'A': 7, 'Z': 0 } # number of coordinates of each path command
 
 class PathCreator:
+    '''Creates SVG path data
+
+    The commands are stored as ASCII letters in the bytearray commands and
+    their coordinates as doubles in the array coords, in the order of the SVG syntax (see add_command).
+    Path data added as string with add is kept in the list raw and written unchanged,
+    its place in commands is marked by RAW.
+    The path string is rendered from these buffers when the property path is read.
+    The geometry is computed on plain floats with the scalar helpers (pol2xy etc.).
+    '''
+
+    RAW = 0 # marks path data added as string
 
     def __init__(self, p, alpha = 0.0):
         self.x, self.y = p
         self.alpha = alpha
-        self.path = f'M {fmt_f(self.x, self.y)}'
+        self.commands = bytearray()
+        self.coords = array('d')
+        self.raw = []
+        self._path = None
+        self.add_command('M', self.x, self.y)
 
     def add(self, path):
-        self.path += ' ' + path
+        '''appends path data given as string, it is written unchanged'''
+        self.commands.append(self.RAW)
+        self.raw.append(path)
+        self._path = None
+
+    def add_command(self, command, *coords):
+        '''appends a path command with its coordinates, e.g. add_command('L', x, y)'''
+        if len(coords) != PATH_COMMANDS[command]:
+            raise ValueError(f'path command {command} needs {PATH_COMMANDS[command]} coordinates')
+        self.commands.append(ord(command))
+        self.coords.extend(coords)
+        self._path = None
+
+    def segments(self):
+        '''yields the tuples (command, coordinates) of the path, path data added as string as (None, path)'''
+        coords = self.coords.tolist()
+        raw = iter(self.raw)
+        i = 0
+        for c in self.commands:
+            if c == self.RAW:
+                yield None, next(raw)
+                continue
+            command = chr(c)
+            n = PATH_COMMANDS[command]
+            yield command, coords[i:i + n]
+            i += n
+
+    def render(self, precision=3, trim=False):
+        '''renders the SVG path data from the command and coordinate buffers
+
+        All coordinates are formatted in one call of fmt_values.
+        '''
+        values = fmt_values(self.coords, precision, trim)
+        raw = iter(self.raw)
+        parts = []
+        i = 0
+        for c in self.commands:
+            if c == self.RAW:
+                parts.append(next(raw))
+                continue
+            command = chr(c)
+            n = PATH_COMMANDS[command]
+            if command == 'A':
+                rx, ry, _, _, _, x, y = values[i:i + n]
+                rotation, large, clockwise = self.coords[i + 2:i + 5]
+                parts.append(f'A {rx} {ry} {int(rotation)} {int(large)} {int(clockwise)} {x} {y}')
+            elif n:
+                parts.append(command + ' ' + ' '.join(values[i:i + n]))
+            else:
+                parts.append(command)
+            i += n
+        return ' '.join(parts)
+
+    def repeat_rotated(self, n, angle, start=1):
+        '''appends n - 1 copies of the commands from index start on
+
+        Copy i is rotated by i * angle around the origin.
+        The copies are computed in one vectorized operation.
+        '''
+        commands = self.commands[start:]
+        if not commands:
+            raise ValueError(f'no path commands to repeat from index {start} on')
+        if self.RAW in commands:
+            raise ValueError('path data added as string can not be rotated')
+        if any(c in b'HV' for c in commands):
+            raise ValueError('horizontal and vertical lines can not be rotated')
+        offset = sum(PATH_COMMANDS[chr(c)] for c in self.commands[:start] if c != self.RAW)
+        xi, yi, i = [], [], offset
+        for c in commands:
+            command = chr(c)
+            n_coords = PATH_COMMANDS[command]
+            first = i + 5 if command == 'A' else i # only the end point of an arc is rotated
+            xi.extend(range(first - offset, i + n_coords - offset, 2))
+            yi.extend(range(first + 1 - offset, i + n_coords - offset, 2))
+            i += n_coords
+        coords = np.array(self.coords[offset:])
+        phi = angle * np.arange(1, n)[:, np.newaxis]
+        cos, sin = np.cos(phi), np.sin(phi)
+        x, y = coords[xi], coords[yi]
+        copies = np.tile(coords, (n - 1, 1))
+        copies[:, xi] = cos * x - sin * y
+        copies[:, yi] = sin * x + cos * y
+        self.commands.extend(commands * (n - 1))
+        self.coords.frombytes(copies.tobytes())
+        self._path = None
+        if n > 1:
+            self.x, self.y = copies[-1, xi[-1]], copies[-1, yi[-1]]
+            self.alpha += (n - 1) * angle
+        return self
+
+    @property
+    def path(self):
+        if self._path is None:
+            self._path = self.render()
+        return self._path
+
+    @path.setter
+    def path(self, path):
+        self.commands = bytearray([self.RAW])
+        self.coords = array('d')
+        self.raw = [path]
+        self._path = None
     
     def pos(self):
         return np.array([self.x, self.y])
@@ -188,72 +878,113 @@ class PathCreator:
 
     def curve_to(self, p, alpha):
         x1, y1 = p
-        x0, y0 = self.intersection_point(x1, y1, alpha)
-        self.add(f'Q {fmt_f(x0, y0, x1, y1)}')
+        x0, y0 = intersection_xy(self.x, self.y, self.alpha, x1, y1, alpha)
+        self.add_command('Q', x0, y0, x1, y1)
         self.x, self.y, self.alpha = x1, y1, alpha
         return self
 
+    def curves_to(self, points, angles):
+        '''adds a chain of quadratic curves through the points with the tangent angles
+
+        The result is the same as calling curve_to for each point,
+        but all control points are computed in one call of intersection_points.
+        '''
+        points = np.asarray(points, dtype=float).reshape(-1, 2)
+        angles = np.asarray(angles, dtype=float).ravel()
+        if len(points) != len(angles):
+            raise ValueError(f'{len(points)} points but {len(angles)} angles')
+        if len(points) == 0:
+            return self
+        x0 = np.concatenate(([self.x], points[:-1, 0]))
+        y0 = np.concatenate(([self.y], points[:-1, 1]))
+        alpha0 = np.concatenate(([self.alpha], angles[:-1]))
+        controls = intersection_points(x0, y0, alpha0, points[:, 0], points[:, 1], angles)
+        if np.isnan(controls).any():
+            raise ValueError('tangents of consecutive points are parallel')
+        self.commands.extend(b'Q' * len(points))
+        self.coords.frombytes(np.concatenate((controls, points), axis=1).tobytes())
+        self._path = None
+        self.x, self.y, self.alpha = float(points[-1, 0]), float(points[-1, 1]), float(angles[-1])
+        return self
+
+    def cubic_to(self, c1, c2, p):
+        '''adds a cubic Bézier curve with the control points c1 and c2 to p'''
+        x1, y1 = c1
+        x2, y2 = c2
+        x, y = p
+        self.add_command('C', x1, y1, x2, y2, x, y)
+        self.x, self.y, self.alpha = x, y, angle((x - x2, y - y2))
+        return self
+
     def arc(self, length, r):
-        m = self.pos() + pol2cart(r, self.alpha + np.pi/2)
+        dx, dy = pol2xy(r, self.alpha + np.pi/2)
+        mx, my = self.x + dx, self.y + dy
         beta = self.alpha + np.pi/2 + length/r
-        p = m - pol2cart(r, beta)
-        self.arc_to_line(p, beta - np.pi/2)
+        dx, dy = pol2xy(r, beta)
+        self.arc_to_line((mx - dx, my - dy), beta - np.pi/2)
         return self
      
     def arc_to_point(self, p, r):
-        o = self.pos() # Ausgangspunkt
-        q = (o + np.array(p)) / 2 # Mittelpunkt zwischen Anfangs- und Endpunkt
-        d = distance(q, p)
-        c = np.sqrt(r**2 - d**2)
-        m = q + orth(pol2cart(r, angle(p - o))) * c/np.abs(r) # Mittelpunkt des Kreises
-        self.x, self.y, self.alpha = *p, angle(p - m) + np.pi/2
-        clockwise = '1'
-        if r < 0: r, clockwise, self.alpha = -r, '0', self.alpha + np.pi
-        self.add(f'A {fmt_f(r, r)} 0 0 {clockwise} {fmt_f(self.x, self.y)}')
+        px, py = p
+        ox, oy = self.x, self.y # Ausgangspunkt
+        qx, qy = (ox + px) / 2, (oy + py) / 2 # Mittelpunkt zwischen Anfangs- und Endpunkt
+        d = distance_xy(qx, qy, px, py)
+        if r**2 < d**2:
+            raise ValueError(f'radius {r} is too small for an arc to point {p}')
+        c = math.sqrt(r**2 - d**2)
+        vx, vy = orth_xy(*pol2xy(r, angle_xy(px - ox, py - oy)))
+        mx, my = qx + vx * c / abs(r), qy + vy * c / abs(r) # Mittelpunkt des Kreises
+        self.x, self.y, self.alpha = px, py, angle_xy(px - mx, py - my) + np.pi/2
+        clockwise = 1
+        if r < 0: r, clockwise, self.alpha = -r, 0, self.alpha + np.pi
+        self.add_command('A', r, r, 0, 0, clockwise, self.x, self.y)
         return self
     
     def arc_to_line(self, p, alpha):
-        large, clockwise = '0', '0'
+        large, clockwise = 0, 0
         delta = norm_angle(norm_angle(alpha) - norm_angle(self.alpha))
-        if delta == 0 or delta == np.pi:
+        x, y = self.x, self.y
+        if delta == 0 or delta == np.pi or abs(math.sin(delta)) < PARALLEL_TOLERANCE:
             #TODO: Clockwise stimmt noch nicht bei 180°
-            q = intersection_point(self.x, self.y, self.alpha + np.pi/2, *p, alpha)
-            m = (q + self.pos()) / 2
+            qx, qy = intersection_xy(x, y, self.alpha + np.pi/2, *p, alpha)
+            mx, my = (qx + x) / 2, (qy + y) / 2
         else:
-            r0, r1 = intersection_r(self.x, self.y, self.alpha, *p, alpha)
-            s = self.pos() + pol2cart(r0, self.alpha)
-            q = pol2cart(length(s - self.pos()), alpha)
+            r0, r1 = intersection_r(x, y, self.alpha, *p, alpha)
+            dx, dy = pol2xy(r0, self.alpha)
+            sx, sy = x + dx, y + dy
+            dx, dy = pol2xy(length_xy(sx - x, sy - y), alpha)
             if (r0 >= 0):
-                q = s + q
-                if delta < radians(180): clockwise = '1'
+                qx, qy = sx + dx, sy + dy
+                if delta < np.pi: clockwise = 1
             else:
-                q = s - q
-                large = '1'
-                if delta > radians(180): clockwise = '1'
-            m = (self.pos() + q) / 2
-            m = intersection_point(*s, angle(m - s), *q, alpha + radians(90))
-        r = distance(m, self.pos())
-        self.add(f'A {fmt_f(r, r)} 0 {large} {clockwise} {fmt_f(*q)}')
-        self.x, self.y, self.alpha = *q, alpha
+                qx, qy = sx - dx, sy - dy
+                large = 1
+                if delta > np.pi: clockwise = 1
+            mx, my = (x + qx) / 2, (y + qy) / 2
+            mx, my = intersection_xy(sx, sy, angle_xy(mx - sx, my - sy), qx, qy, alpha + np.pi/2)
+        r = distance_xy(mx, my, x, y)
+        self.add_command('A', r, r, 0, large, clockwise, qx, qy)
+        self.x, self.y, self.alpha = qx, qy, alpha
         return self
 
     def line_to(self, *points):
         for x, y in points:
-            self.add(f'L {fmt_f(x, y)}')
+            self.add_command('L', x, y)
             self.x, self.y, self.alpha = x, y, angle((x - self.x, y - self.y))
         return self
 
     def line(self, length):
-        return self.line_to(self.pos() + pol2cart(length, self.alpha))
+        dx, dy = pol2xy(length, self.alpha)
+        return self.line_to((self.x + dx, self.y + dy))
     
     def move_to(self, p, angle=0.0):
         self.x, self.y = p
         self.alpha = angle
-        self.add(f'M {fmt_f(self.x, self.y)}')
+        self.add_command('M', self.x, self.y)
         return self
 
     def close(self):
-        self.add('Z')
+        self.add_command('Z')
         return self
 
 THICK_STROKE = { 'stroke': 'black', 'stroke-width': '0.35', 'stroke-linecap': 'round' }
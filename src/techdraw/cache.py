@@ -0,0 +1,250 @@
+'''Caches for computed geometry and rendered files
+
+LRUCache is a bounded in-process cache with hit and miss counters.
+It may be backed by a DiskCache so that a fresh process can reuse
+values that were computed by another process.
+Values stored on disk must be JSON serializable.
+
+RenderCache stores the output files of the command line tools,
+addressed by the hash of the normalized parameters they were rendered from
+and of the source code of techdraw, so that a changed renderer never returns old files.
+'''
+
+import os
+import json
+import shutil
+import hashlib
+import tempfile
+import functools
+from collections import OrderedDict
+import techdraw
+
+RENDER_CACHE_SIZE = 256 * 1024 * 1024 # bytes
+RENDER_CACHE_EVICT_TO = 0.9 # part of max_size kept by an eviction, so it is not repeated on the next store
+
+class DiskCache:
+    '''Stores JSON serializable values in files named after the hash of their key'''
+
+    extension = '.json'
+
+    def __init__(self, directory):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def filename(self, key: str) -> str:
+        return os.path.join(self.directory, hashlib.sha256(key.encode('utf-8')).hexdigest() + self.extension)
+
+    def get(self, key: str):
+        '''returns the value stored for key or None'''
+        try:
+            with open(self.filename(key), encoding='utf-8') as f:
+                entry = json.load(f)
+        except (OSError, ValueError):
+            return None
+        return entry['value'] if entry.get('key') == key else None
+
+    def put(self, key: str, value):
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'w', encoding='utf-8') as f:
+                json.dump({'key': key, 'value': value}, f)
+            os.replace(tmp, self.filename(key))
+        except BaseException:
+            os.unlink(tmp)
+            raise
+
+class RenderCache(DiskCache):
+    '''Stores copies of rendered files with a bound of their total size
+
+    If the files take more than max_size bytes, the least recently used ones are removed.
+    The total size is counted in memory, the directory is only scanned
+    by the first store and when the count exceeds max_size.
+    '''
+
+    extension = '.out'
+
+    def __init__(self, directory=None, max_size=RENDER_CACHE_SIZE):
+        super().__init__(directory or default_directory())
+        self.max_size = max_size
+        self.size = None # total size of the files, None until the directory is scanned
+
+    @staticmethod
+    def key(*params) -> str:
+        '''returns the key of JSON serializable parameters, it contains the version and the source hash of techdraw'''
+        return json.dumps([techdraw.__version__, source_hash(), *params], sort_keys=True, separators=(',', ':'))
+
+    def fetch(self, key: str, filename: str) -> bool:
+        '''copies the file stored for key to filename, returns False if there is none'''
+        source = self.filename(key)
+        try:
+            os.utime(source) # marks the file as recently used
+            shutil.copyfile(source, filename)
+        except FileNotFoundError:
+            return False # not stored or removed by another process in the meantime
+        return True
+
+    def store(self, key: str, filename: str):
+        '''stores a copy of the file for key and removes old files if the cache is too large'''
+        if self.size is None:
+            self.evict()
+        target = self.filename(key)
+        try:
+            self.size -= os.stat(target).st_size # replaced
+        except FileNotFoundError:
+            pass
+        fd, tmp = tempfile.mkstemp(dir=self.directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as f, open(filename, 'rb') as source:
+                shutil.copyfileobj(source, f)
+                self.size += f.tell()
+            os.replace(tmp, target)
+        except BaseException:
+            os.unlink(tmp)
+            raise
+        if self.size > self.max_size:
+            self.evict(int(self.max_size * RENDER_CACHE_EVICT_TO))
+
+    def evict(self, max_size=None):
+        '''removes the least recently used files until they take at most max_size bytes (default: self.max_size)'''
+        if max_size is None:
+            max_size = self.max_size
+        entries = []
+        for entry in os.scandir(self.directory):
+            if entry.name.endswith(self.extension):
+                try:
+                    stat = entry.stat()
+                except FileNotFoundError:
+                    continue
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        size = sum(entry[1] for entry in entries)
+        for _, file_size, path in sorted(entries):
+            if size <= max_size:
+                break
+            try:
+                os.unlink(path)
+            except FileNotFoundError:
+                pass # removed by another process
+            size -= file_size
+        self.size = size
+
+@functools.lru_cache(maxsize=None)
+def source_hash() -> str:
+    '''returns the SHA-256 hash of the Python sources of the techdraw package'''
+    root = os.path.dirname(os.path.abspath(techdraw.__file__))
+    files = []
+    for directory, subdirectories, names in os.walk(root):
+        subdirectories[:] = sorted(name for name in subdirectories if name != '__pycache__')
+        files.extend(os.path.join(directory, name) for name in names if name.endswith('.py'))
+    digest = hashlib.sha256()
+    for path in sorted(files):
+        digest.update(os.path.relpath(path, root).replace(os.sep, '/').encode('utf-8') + b'\0')
+        with open(path, 'rb') as f:
+            digest.update(hashlib.sha256(f.read()).digest())
+    return digest.hexdigest()
+
+def default_directory():
+    '''returns the directory of the render cache: $XDG_CACHE_HOME/techdraw or ~/.cache/techdraw'''
+    return os.path.join(os.environ.get('XDG_CACHE_HOME') or os.path.join(os.path.expanduser('~'), '.cache'), 'techdraw')
+
+def add_arguments(parser):
+    '''adds the options of the render cache to an ArgumentParser'''
+    parser.add_argument('--cache-dir', type=str, metavar='DIR', help=f'directory of the render cache (default: {default_directory()})', default=None)
+    parser.add_argument('--no-cache', action='store_true', help='always render, neither read nor write the render cache')
+
+def from_arguments(args):
+    '''returns the RenderCache selected by the parsed options or None'''
+    return None if args.no_cache else RenderCache(args.cache_dir)
+
+def output_params(filename, output_format, compresslevel):
+    '''returns the settings which determine the content of an SVG file besides the drawing'''
+    compressed = filename.lower().endswith('.svgz')
+    return { 'format': output_format and output_format.params(), 'compresslevel': compresslevel if compressed else None }
+
+def render(cache, key, filename, function):
+    '''calls function(filename) unless the file for key is in the cache, cache may be None
+
+    A rendered file is stored in the cache. Returns True if the file was taken from the cache.
+    '''
+    if cache is not None and cache.fetch(key, filename):
+        return True
+    function(filename)
+    if cache is not None:
+        cache.store(key, filename)
+    return False
+
+class LRUCache:
+    '''Bounded least recently used cache with an optional DiskCache behind it
+
+    maxsize bounds the number of entries, maxbytes the total len() of the values, e.g. of bytes.
+    None means no bound. A value larger than maxbytes is not kept.
+    '''
+
+    def __init__(self, maxsize=256, disk=None, maxbytes=None):
+        self.maxsize = maxsize
+        self.maxbytes = maxbytes
+        self.disk = disk
+        self.entries = OrderedDict()
+        self.bytes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def get(self, key: str, compute, load=None):
+        '''returns the value for key
+
+        compute is called without arguments if the value is neither in memory nor on disk.
+        load converts a value read from disk back to its in-memory form.
+        '''
+        try:
+            value = self.entries[key]
+            self.entries.move_to_end(key)
+            self.hits += 1
+            return value
+        except KeyError:
+            pass
+        value = self.disk.get(key) if self.disk is not None else None
+        if value is not None:
+            self.disk_hits += 1
+            if load is not None:
+                value = load(value)
+        else:
+            self.misses += 1
+            value = compute()
+            if self.disk is not None:
+                self.disk.put(key, value)
+        self.put(key, value)
+        return value
+
+    def put(self, key: str, value):
+        '''stores a value in memory, e.g. one that was computed asynchronously'''
+        if key in self.entries:
+            self._remove(key)
+        if self.maxbytes is not None:
+            if len(value) > self.maxbytes:
+                return
+            self.bytes += len(value)
+        self.entries[key] = value
+        while (self.maxsize is not None and len(self.entries) > self.maxsize) or \
+                (self.maxbytes is not None and self.bytes > self.maxbytes):
+            self._remove(next(iter(self.entries)))
+
+    def _remove(self, key):
+        value = self.entries.pop(key)
+        if self.maxbytes is not None:
+            self.bytes -= len(value)
+
+    def __contains__(self, key):
+        return key in self.entries
+
+    def clear(self):
+        self.entries.clear()
+        self.bytes = 0
+        self.hits = self.disk_hits = self.misses = 0
+
+    def stats(self):
+        '''returns the counters of the cache as dict'''
+        result = { 'hits': self.hits, 'disk_hits': self.disk_hits, 'misses': self.misses,
+                   'size': len(self.entries), 'maxsize': self.maxsize }
+        if self.maxbytes is not None:
+            result.update(bytes=self.bytes, maxbytes=self.maxbytes)
+        return result
@@ -1,7 +1,36 @@
 
 import math
+from collections import namedtuple
+import xml.etree.ElementTree as etree
 import techdraw.involute as involute
 import techdraw as svg
+from techdraw.cache import LRUCache
+
+PROFILE_CACHE_SIZE = 1024
+
+# Cache of tooth profiles and path data, assign a techdraw.cache.DiskCache to cache.disk to keep them on disk
+cache = LRUCache(PROFILE_CACHE_SIZE)
+
+ToothProfile = namedtuple('ToothProfile', ['r_0', 'r_head', 'r_foot', 'r_base', 'tau', 'beta_0', 'beta', 'gamma', 'theta_head'])
+ToothProfile.__doc__ = '''Radii and angles of a tooth, theta_head is the involute angle of the head point'''
+
+def tooth_profile(modul, n_teeth, alpha):
+    '''returns the cached ToothProfile of a gear wheel'''
+    key = f'profile {modul!r} {n_teeth!r} {alpha!r}'
+    return cache.get(key, lambda: _tooth_profile(modul, n_teeth, alpha), ToothProfile._make)
+
+def _tooth_profile(modul, n_teeth, alpha):
+    C = 0.167 # Magische Konstante, siehe: https://www.tec-science.com/de/getriebe-technik/evolventenverzahnung/evolventen-zahnrad-geometrie/
+    r_0 = modul * n_teeth / 2
+    r_head = r_0 + modul
+    r_base = r_0 * math.cos(alpha)
+    r_foot = min(r_0 - modul, r_base) - C * modul
+    tau = 2 * math.pi / n_teeth
+    beta_0 = tau / 4
+    beta = beta_0 + involute.gamma(alpha)
+    theta_head = involute.inverse(r_base, r_head)
+    gamma = beta - involute.gamma(theta_head)
+    return ToothProfile(r_0, r_head, r_foot, r_base, tau, beta_0, beta, gamma, theta_head)
 
 class GearWheel:
     ''' Involute gear wheel'''
@@ -10,39 +39,54 @@ class GearWheel:
         self.modul = modul
         self.n_teeth = n_teeth
         self.alpha = alpha
+        self._profile = None # (modul, n_teeth, alpha), ToothProfile of the last lookup
+
+    def params(self):
+        '''returns the parameters as dict, e.g. as key of a cache'''
+        return { 'modul': float(self.modul), 'n_teeth': int(self.n_teeth), 'alpha': float(self.alpha) }
+
+    def profile(self):
+        '''returns the cached ToothProfile of the gear wheel
+
+        It is looked up in the cache once and kept until a parameter changes,
+        so the counters of the cache only count the lookups of different gear wheels.
+        '''
+        params = self.modul, self.n_teeth, self.alpha
+        if self._profile is None or self._profile[0] != params:
+            self._profile = params, tooth_profile(*params)
+        return self._profile[1]
 
     def r_0(self):
         '''returns the radius of the gear wheel (Teilkreisradius)'''
-        return self.modul * self.n_teeth / 2
+        return self.profile().r_0
 
     def r_head(self):
         '''returns the radius of the tooth heads (Kopfkreisradius)'''
-        return self.r_0() + self.modul
+        return self.profile().r_head
 
     def r_foot(self):
         '''returns the radius of the tooth foot (Fußkreisradius)'''
-        C = 0.167 # Magische Konstante, siehe: https://www.tec-science.com/de/getriebe-technik/evolventenverzahnung/evolventen-zahnrad-geometrie/
-        return min(self.r_0() - self.modul, self.r_base()) - C * self.modul
+        return self.profile().r_foot
 
     def r_base(self):
         '''returns the radius of the base circle'''
-        return self.r_0() * math.cos(self.alpha)
+        return self.profile().r_base
 
     def tau(self):
         '''returns the angle between two teeth'''
-        return 2 * math.pi / self.n_teeth
+        return self.profile().tau
 
     def beta_0(self):
         '''returns the angle offsets of the intesection of the tooth with the Teilkreis'''
-        return self.tau() / 4
+        return self.profile().beta_0
 
     def beta(self):
         '''returns the angle offsets of the tooth base point'''
-        return self.beta_0() + involute.gamma(self.alpha)
+        return self.profile().beta
 
     def gamma(self):
         '''returns the angle offsets of the tooths head point'''
-        return self.beta() - involute.gamma(involute.inverse(self.r_base(), self.r_head()))
+        return self.profile().gamma
 
     def tooth_ctrl_points(self):
         '''returns the controls points of a tooth
@@ -54,29 +98,81 @@ class GearWheel:
         tangent: tangent of the tooth in that control point
         '''
 
-        r_0, r_h, r_b, r_f = self.r_0(), self.r_head(), self.r_base(), self.r_foot()
-        b_0, b_h, b_b, b_f = self.beta_0(), self.gamma(), self.beta(), self.tau() / 2
-
-        return [(r_h, b_h, b_h - involute.inverse(r_b, r_h)),
-                (r_0, b_0, b_0 - self.alpha),
-                (r_b, b_b, b_b),
-                (r_f, b_f, b_f + math.pi /2)]
+        p = self.profile()
+        return [(p.r_head, p.gamma, p.gamma - p.theta_head),
+                (p.r_0, p.beta_0, p.beta_0 - self.alpha),
+                (p.r_base, p.beta, p.beta),
+                (p.r_foot, p.tau / 2, p.tau / 2 + math.pi /2)]
 
     def svg_path(self):
-        r_0, r_h, r_b, r_f = self.r_0(), self.r_head(), self.r_base(), self.r_foot()
-        b_0, b_h, b_b, b_f = self.beta_0(), self.gamma(), self.beta(), self.tau() / 2
-
-        path = svg.PathCreator(svg.pol2cart(r_f, -b_f), -b_f / 2 + math.pi/2)
-        for i in range(self.n_teeth):
-            offset = i * self.tau()
-            path.curve_to(svg.pol2cart(r_b, offset - b_b), offset - b_b)
-            path.curve_to(svg.pol2cart(r_0, offset - b_0), offset - b_0 + self.alpha)
-            path.curve_to(svg.pol2cart(r_h, offset - b_h), offset - b_h + involute.inverse(r_b, r_h))
-            path.alpha = offset - b_h + math.pi/2
-            path.arc_to_line(svg.pol2cart(r_h, offset + b_h), offset + b_h + math.pi/2)
-            path.alpha = offset + b_h - involute.inverse(r_b, r_h)
-            path.curve_to(svg.pol2cart(r_0, offset + b_0), offset + b_0 - self.alpha)
-            path.curve_to(svg.pol2cart(r_b, offset + b_b), offset + b_b)
-            path.curve_to(svg.pol2cart(r_f, offset + b_f), offset + b_f + math.pi/2)
+        '''returns the cached SVG path of the gear wheel'''
+        key = f'path {self.modul!r} {self.n_teeth!r} {self.alpha!r}'
+        return cache.get(key, self._svg_path)
+
+    def svg_tooth_path(self):
+        '''returns the cached SVG path of one tooth, from the foot point at -tau/2 to the foot point at tau/2'''
+        key = f'tooth {self.modul!r} {self.n_teeth!r} {self.alpha!r}'
+        return cache.get(key, lambda: self._tooth_path().path)
+
+    def _svg_path(self):
+        '''constructs the path of one tooth and replicates it by rotation for all other teeth'''
+        path = self._tooth_path()
+        path.repeat_rotated(self.n_teeth, self.profile().tau)
         path.close()
         return path.path
+
+    def _tooth_path(self):
+        '''returns a PathCreator with the path of one tooth'''
+        p = self.profile()
+        r_0, r_h, r_b, r_f = p.r_0, p.r_head, p.r_base, p.r_foot
+        b_0, b_h, b_b, b_f = p.beta_0, p.gamma, p.beta, p.tau / 2
+
+        path = svg.PathCreator(svg.pol2xy(r_f, -b_f), -b_f + math.pi/2)
+        path.curve_to(svg.pol2xy(r_b, -b_b), -b_b)
+        path.curve_to(svg.pol2xy(r_0, -b_0), -b_0 + self.alpha)
+        path.curve_to(svg.pol2xy(r_h, -b_h), -b_h + p.theta_head)
+        path.alpha = -b_h + math.pi/2
+        path.arc_to_line(svg.pol2xy(r_h, b_h), b_h + math.pi/2)
+        path.alpha = b_h - p.theta_head
+        path.curve_to(svg.pol2xy(r_0, b_0), b_0 - self.alpha)
+        path.curve_to(svg.pol2xy(r_b, b_b), b_b)
+        path.curve_to(svg.pol2xy(r_f, b_f), b_f + math.pi/2)
+        return path
+
+    def svg_instances(self, img, parent, attrib={}, **extra):
+        '''adds the gear wheel to parent with the path of one tooth defined once in img
+
+        The teeth are use elements of the tooth, rotated by multiples of tau.
+        They are filled together with the foot circle in a first pass and stroked in a second one,
+        because the fill of the open tooth path is closed by a chord inside the foot circle.
+        '''
+        tooth = img.define(etree.Element('path', {'d': self.svg_tooth_path()}))
+        teeth = etree.Element('g')
+        for i in range(self.n_teeth):
+            svg.Use(teeth, tooth, rotation=i * self.tau())
+        teeth = img.define(teeth)
+        g = etree.SubElement(parent, 'g', {'fill': 'lightgrey', **svg.THICK_STROKE, **attrib}, **extra)
+        etree.SubElement(g, 'circle', {'r': svg.fmt_f(self.r_foot()), 'stroke': 'none'})
+        svg.Use(g, teeth, stroke='none')
+        svg.Use(g, teeth, fill='none')
+        return g
+
+    def svg_image(self, instancing=False):
+        '''returns an SVG image of the gear wheel with its construction circles
+
+        With instancing the teeth are use elements of one tooth, see svg_instances.
+        '''
+        M = (0, 0)
+        c = int(self.r_head() + 1)
+        w = c * 2
+        img = svg.Image((w, w), (c, c), instancing=instancing)
+        img.desc.text = f'Gear wheel: modul = {self.modul}, teeth = {self.n_teeth}, alpha = {svg.degrees(self.alpha)}, d = {svg.fmt_f(2 * self.r_0())}'
+        if instancing:
+            self.svg_instances(img, img.content)
+        else:
+            svg.Path(img.content, self.svg_path())
+        svg.Circle(img.content, M, self.r_head(), svg.DASH_STROKE, fill='none')
+        svg.Circle(img.content, M, self.r_0(), svg.SYM_STROKE, fill='none')
+        svg.Circle(img.content, M, self.r_base(), svg.DOT_STROKE, fill='none')
+        svg.Circle(img.content, M, self.r_foot(), svg.DASH_STROKE, fill='none')
+        return img
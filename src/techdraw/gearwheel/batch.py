@@ -0,0 +1,120 @@
+'''Renders a catalog of gear wheels
+
+The gear wheels are read from a CSV or JSON file.
+A CSV file has a header line with the column names,
+a JSON file contains an array of objects:
+
++----------+-------+------------------------------------------------------+
+| Name     | Type  | Description                                          |
++----------+-------+------------------------------------------------------+
+| modul    | float | modul in mm (default: 2.0)                           |
++----------+-------+------------------------------------------------------+
+| teeth    | int   | number of teeth                                      |
++----------+-------+------------------------------------------------------+
+| pitch    | float | pitch angle in degrees (default: 20.0)               |
++----------+-------+------------------------------------------------------+
+| filename | str   | name of the output file inside the output directory, |
+|          |       | the extension .svgz writes a compressed file         |
++----------+-------+------------------------------------------------------+
+
+Example:
+
+    [{"modul": 1.5, "teeth": 30}, {"modul": 2, "teeth": 212, "pitch": 15}]
+
+The gear wheels are rendered on a pool of worker processes,
+so the start-up cost of the interpreter and NumPy is paid once per worker.
+Errors are reported per gear wheel and a summary of the throughput is printed at the end.
+With --png a PNG preview is written next to each SVG file.
+Files rendered before with the same parameters are copied from the render cache.
+'''
+
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import techdraw as svg
+from techdraw import profiling, raster, cache as render_cache
+from . import GearWheel
+
+def read_specs(filename):
+    '''Reads the gear wheel specifications from a CSV or JSON file'''
+    with open(filename, newline='') as f:
+        if os.path.splitext(filename)[1].lower() == '.json':
+            return json.load(f)
+        return list(csv.DictReader(f))
+
+def parse_spec(spec):
+    '''returns modul, teeth and pitch of a gear wheel specification, empty values are replaced by defaults'''
+    return float(spec.get('modul') or 2.0), int(spec['teeth']), float(spec.get('pitch') or 20.0)
+
+def spec_filename(spec, extension='.svg'):
+    '''returns the output file name of a gear wheel specification'''
+    if spec.get('filename'):
+        return spec['filename']
+    modul, teeth, pitch = parse_spec(spec)
+    return f'gearwheel-m{modul:g}-t{teeth}-p{pitch:g}{extension}'
+
+def render_spec(spec, directory, output_format=None, extension='.svg', compresslevel=svg.COMPRESSLEVEL_DEFAULT, png_size=None, instancing=False, cache=None):
+    '''Renders one gear wheel specification to the directory, returns the file name
+
+    If png_size is given, a PNG preview with this size is written, too.
+    Files found in the RenderCache cache are copied instead of rendered.
+    '''
+    modul, teeth, pitch = parse_spec(spec)
+    filename = os.path.join(directory, spec_filename(spec, extension))
+    gear_wheel = GearWheel(modul, teeth, svg.radians(pitch))
+    params = gear_wheel.params(), instancing
+    key = render_cache.RenderCache.key('gearwheel.svg', *params, render_cache.output_params(filename, output_format, compresslevel))
+    render_cache.render(cache, key, filename,
+        lambda filename: gear_wheel.svg_image(instancing).write(filename, output_format=output_format, compresslevel=compresslevel))
+    if png_size:
+        key = render_cache.RenderCache.key('gearwheel.png', *params, png_size)
+        render_cache.render(cache, key, os.path.splitext(filename)[0] + '.png',
+            lambda filename: raster.thumbnail(gear_wheel.svg_image(instancing), filename, png_size))
+    return filename
+
+if __name__ == "__main__":
+    PROG = 'python -m techdraw.gearwheel.batch'
+    parser = argparse.ArgumentParser(prog=PROG, description='Renders a catalog of gear wheels to SVG files.')
+    parser.add_argument('specs', type=str, help='CSV or JSON file with the gear wheel specifications')
+    parser.add_argument('-o', '--output', type=str, help='output directory', default='.')
+    parser.add_argument('-j', '--jobs', type=int, help='number of worker processes (default: number of CPUs)', default=None)
+    parser.add_argument('--instancing', action='store_true', help='define the path of one tooth once and reference it for all teeth')
+    parser.add_argument('--compact', action='store_true', help='write relative path commands without redundant whitespace and zeros')
+    parser.add_argument('--precision', type=svg.OutputFormat.precision_option, help='number of decimals of coordinates', default=None)
+    parser.add_argument('-z', '--svgz', action='store_true', help='write compressed .svgz files')
+    parser.add_argument('--compresslevel', type=int, choices=range(10), metavar='0..9', help='gzip compression level of .svgz files', default=svg.COMPRESSLEVEL_DEFAULT)
+    parser.add_argument('--png', type=int, nargs='?', const=raster.THUMBNAIL_SIZE, metavar='SIZE', help=f'write PNG previews of SIZE pixels (default: {raster.THUMBNAIL_SIZE})', default=None)
+    render_cache.add_arguments(parser)
+    parser.add_argument('--profile', nargs='?', const='-', metavar='FILE', help='write stage timings as JSON to FILE or stderr')
+    args = parser.parse_args()
+    profiling.start(args.profile)
+
+    try:
+        specs = read_specs(args.specs)
+        os.makedirs(args.output, exist_ok=True)
+    except Exception as error:
+        print(PROG + ':', error, file=sys.stderr)
+        sys.exit(-1)
+
+    output_format = svg.OutputFormat.create(args.compact, args.precision)
+    cache = render_cache.from_arguments(args)
+    start = time.perf_counter()
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.jobs, initializer=profiling.disable) as pool:
+        futures = [pool.submit(render_spec, spec, args.output, output_format, '.svgz' if args.svgz else '.svg', args.compresslevel, args.png, args.instancing, cache) for spec in specs]
+        for i, future in enumerate(futures):
+            try:
+                profiling.output_file(future.result())
+            except Exception as error:
+                failed += 1
+                print(f'{PROG}: gear wheel {i + 1} {specs[i]}: {error}', file=sys.stderr)
+    elapsed = time.perf_counter() - start
+
+    done = len(specs) - failed
+    print(f'{done} of {len(specs)} gear wheels rendered in {elapsed:.2f} s ({done / elapsed if elapsed else 0:.1f} per second)', file=sys.stderr)
+    if failed:
+        sys.exit(1)
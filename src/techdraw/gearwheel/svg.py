@@ -3,25 +3,28 @@
 import argparse
 from . import GearWheel
 import techdraw as svg
+from techdraw import profiling, cache as render_cache
 
 if __name__ == "__main__":
     parser = argparse.ArgumentParser(prog='python -m techdraw.gearwheel.svg', description='Generates an SVG image with a gear wheel.')
-    parser.add_argument('filename', type=str, help='file name')
+    parser.add_argument('filename', type=str, help='file name, the extension .svgz writes a compressed file')
     parser.add_argument('-m', '--modul', type=float, help='modul in mm', default=2.0)
     parser.add_argument('-t', '--teeth', type=int, help='number of teeth', default=30)
     parser.add_argument('-p', '--pitch', type=float, help='pitch angle', default=20.0)
+    parser.add_argument('--instancing', action='store_true', help='define the path of one tooth once and reference it for all teeth')
+    parser.add_argument('--compact', action='store_true', help='write relative path commands without redundant whitespace and zeros')
+    parser.add_argument('--precision', type=svg.OutputFormat.precision_option, help='number of decimals of coordinates', default=None)
+    parser.add_argument('--compresslevel', type=int, choices=range(10), metavar='0..9', help='gzip compression level of .svgz files', default=svg.COMPRESSLEVEL_DEFAULT)
+    render_cache.add_arguments(parser)
+    parser.add_argument('--profile', nargs='?', const='-', metavar='FILE', help='write stage timings as JSON to FILE or stderr')
     args = parser.parse_args()
+    profiling.start(args.profile)
 
     gear_wheel = GearWheel(args.modul, args.teeth, svg.radians(args.pitch))
-
-    M = (0, 0)
-    c = int(gear_wheel.r_head() + 1)
-    w = c * 2
-    img = svg.Image((w, w), (c, c))
-    img.desc.text = f'Gear wheel: modul = {gear_wheel.modul}, teeth = {gear_wheel.n_teeth}, alpha = {svg.degrees(gear_wheel.alpha)}, d = {svg.fmt_f(2 * gear_wheel.r_0())}'
-    svg.Path(img.content, gear_wheel.svg_path())
-    svg.Circle(img.content, M, gear_wheel.r_head(), svg.DASH_STROKE, fill='none')
-    svg.Circle(img.content, M, gear_wheel.r_0(), svg.SYM_STROKE, fill='none')
-    svg.Circle(img.content, M, gear_wheel.r_base(), svg.DOT_STROKE, fill='none')
-    svg.Circle(img.content, M, gear_wheel.r_foot(), svg.DASH_STROKE, fill='none')
-    img.write(args.filename)
+    output_format = svg.OutputFormat.create(args.compact, args.precision)
+    cache = render_cache.from_arguments(args)
+    key = render_cache.RenderCache.key('gearwheel.svg', gear_wheel.params(), args.instancing,
+        render_cache.output_params(args.filename, output_format, args.compresslevel))
+    render_cache.render(cache, key, args.filename,
+        lambda filename: gear_wheel.svg_image(args.instancing).write(filename, output_format=output_format, compresslevel=args.compresslevel))
+    profiling.output_file(args.filename)
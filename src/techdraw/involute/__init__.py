@@ -5,29 +5,29 @@ def gamma(alpha):
     '''
     Calculates the angle _gamma_ of _alpha_
         Parameter:
-            alpha: angle on the base circle
+            alpha: angle on the base circle, scalar or array
         Returns:
             involute angle _gamma_ 
     '''
-    return alpha - math.atan(alpha)
+    return alpha - np.arctan(alpha)
 
 def distance(r, alpha):
     '''
     Calculates the distance _s_ to the center of the base circle with radius 1 of an involute point corresponding to _alpha_
         Parameter:
             r:     radius of the base circle
-            alpha: angle on the base circle
+            alpha: angle on the base circle, scalar or array
         Returns:
             distance _s_ of the involute point form the center of the base circle
     '''
-    return r * math.sqrt(alpha ** 2 + 1)
+    return r * np.sqrt(np.square(alpha) + 1)
 
 def point_polar(r, alpha):
     '''
     Calculates the polar coordinates of an involute point (angle _gamma_ and the distance _s_ to the center of the base circle)
         Parameter:
             r: radius of the base circle
-            alpha: angle on the base circle
+            alpha: angle on the base circle, scalar or array
         Returns:
             involute angle _gamma_ 
             distance _s_ of the involute point form the center of the base circle
@@ -40,16 +40,77 @@ def inverse(r, s):
 
     It is a kind of inverse involute funktion.
         Parameter:
-            s: distance of the involute point from the center of the base circle
+            s: distance of the involute point from the center of the base circle, scalar or array
         Returns:
             alpha: angle that the involute function needs to calculate (gamma, s)
+        Raises:
+            ValueError for a scalar s < r, an array has NaN at these positions
     '''
-    return math.sqrt((s / r) ** 2 - 1)
+    if np.ndim(r) == 0 and np.ndim(s) == 0:
+        return math.sqrt((s / r) ** 2 - 1)
+    return np.sqrt(np.square(s / r) - 1)
 
 def point(r, alpha, offset = 0):
+    '''
+    Calculates the cartesian coordinates of involute points
+        Returns:
+            array of shape (2,) for a scalar alpha, (N, 2) for an array of N angles
+    '''
     s, beta = point_polar(r, alpha)
-    return s * np.array([np.cos(beta + offset), np.sin(beta + offset)])
+    return np.stack((s * np.cos(beta + offset), s * np.sin(beta + offset)), axis=-1)
 
 def points(r, alpha, offset, n):
-    alpha = alpha / n
-    return [point(r, (i + 1) * alpha, offset) for i in range(n)]
+    '''Calculates n points of the involute up to _alpha_ as (n, 2) array'''
+    return point(r, np.arange(1, n + 1) * (alpha / n), offset)
+
+def involute_function(phi):
+    '''
+    Calculates the involute function inv(phi) = tan(phi) - phi
+        Parameter:
+            phi: pressure angle, scalar or array
+        Returns:
+            involute value, the angle _gamma_ of the involute point with the pressure angle phi
+    '''
+    return np.tan(phi) - phi
+
+def inverse_involute_function(value, phi=None, iterations=8):
+    '''
+    Calculates the pressure angle phi with inv(phi) = value by Newton iterations
+        Parameter:
+            value: involute value, scalar or array
+            phi:   start value, by default an upper bound of the result
+                   (Newton iterations converge monotonically from above)
+        Returns:
+            pressure angle phi
+    '''
+    value = np.asarray(value, dtype=float)
+    if phi is None:
+        phi = np.minimum(np.cbrt(3 * value), np.arctan(value + math.pi / 2))
+    for _ in range(iterations):
+        tan = np.tan(phi)
+        phi = phi - np.divide(tan - phi - value, tan * tan, out=np.zeros(np.broadcast(value, phi).shape), where=tan != 0)
+    return phi
+
+class InverseTable:
+    '''Precomputed table of the inverse involute function for bulk calculations
+
+    The table is interpolated over the cube root of the involute value
+    because inv(phi) is about phi**3 / 3 for small angles.
+    Optional Newton iterations refine the interpolated value.
+    '''
+
+    def __init__(self, max_angle=math.radians(75), size=4096, iterations=0):
+        self.max_angle = max_angle
+        self.iterations = iterations
+        self.phi = np.linspace(0, max_angle, size)
+        self.u = np.cbrt(involute_function(self.phi))
+
+    def __call__(self, value):
+        '''returns the pressure angle phi with inv(phi) = value'''
+        value = np.asarray(value, dtype=float)
+        if np.any(value > self.u[-1] ** 3):
+            raise ValueError(f'involute value out of range of the table (max. angle {self.max_angle})')
+        phi = np.interp(np.cbrt(value), self.u, self.phi)
+        if self.iterations:
+            phi = inverse_involute_function(value, phi, self.iterations)
+        return phi
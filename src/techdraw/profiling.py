@@ -0,0 +1,221 @@
+'''Opt-in instrumentation of the rendering stages
+
+Inside of a profile() block the hot functions of the imported techdraw modules are replaced
+by wrappers that record the wall time and the number of calls per stage.
+Outside of such a block the original functions run without any overhead.
+
+Example:
+
+    with profiling.profile() as stats:
+        img.write('drawing.svg')
+    print(stats.to_json())
+
+Times are inclusive: a stage contains the time of the other stages it calls,
+e.g. ``write`` contains the formatting of path data that is generated while writing.
+Calls nested in the same stage are not counted twice for the stage.
+The worker processes of the parallel command line tools are not profiled.
+'''
+
+import os
+import sys
+import json
+import atexit
+import time
+import tracemalloc
+import contextlib
+import types
+
+# (module, attribute, stage) of the instrumented functions
+INSTRUMENTS = [
+    ('techdraw', 'pol2cart', 'geometry'),
+    ('techdraw', 'intersection_r', 'geometry'),
+    ('techdraw', 'intersection_point', 'geometry'),
+    ('techdraw', 'intersection_xy', 'geometry'),
+    ('techdraw', 'intersection_points', 'geometry'),
+    ('techdraw', 'PathCreator.add', 'path'),
+    ('techdraw', 'PathCreator.render', 'path'),
+    ('techdraw', 'PathCreator.repeat_rotated', 'path'),
+    ('techdraw', 'fmt_f', 'format'),
+    ('techdraw', 'fmt_values', 'format'),
+    ('techdraw', 'fmt_array', 'format'),
+    ('techdraw', 'Line', 'tree'),
+    ('techdraw', 'Circle', 'tree'),
+    ('techdraw', 'Dot', 'tree'),
+    ('techdraw', 'Path', 'tree'),
+    ('techdraw', 'Text', 'tree'),
+    ('techdraw', 'Image.deduplicate', 'tree'),
+    ('techdraw', 'Image.write', 'write'),
+    ('techdraw.raster', 'rasterize', 'raster'),
+    ('techdraw.raster', 'write_png', 'raster'),
+    ('techdraw.involute', 'point', 'geometry'),
+    ('techdraw.gearwheel', 'tooth_profile', 'geometry'),
+    ('techdraw.gearwheel', 'GearWheel._svg_path', 'path'),
+    ('techdraw.spirograph', 'Spirograph.pen_positions', 'geometry'),
+    ('techdraw.spirograph', 'Spirograph.adaptive_angles', 'geometry'),
+    ('techdraw.spirograph', 'Spirograph.bezier_angles', 'geometry'),
+    ('techdraw.spirograph', 'Spirograph.svg_path_chunks', 'path'),
+]
+
+class Stats:
+    '''Results of a profile() block'''
+
+    def __init__(self):
+        self.stages = {}
+        self.functions = {}
+        self.counters = { 'elements': 0, 'output_chars': 0, 'output_bytes': 0 }
+        self.peak_memory = None
+        self.wall_time = 0.0
+        self._depth = {}
+
+    def record(self, table, name, seconds, calls=1):
+        entry = table.setdefault(name, { 'calls': 0, 'time': 0.0 })
+        entry['calls'] += calls
+        entry['time'] += seconds
+
+    def run(self, stage, name, function, *args, calls=1, **kwargs):
+        '''Calls function and records its time for the function and, unless it is nested in the same stage, for the stage'''
+        if self._depth.get(name):
+            # only the outermost call of a recursion is timed
+            return function(*args, **kwargs)
+        stage_depth = self._depth.get(stage, 0)
+        self._depth[name] = 1
+        self._depth[stage] = stage_depth + 1
+        start = time.perf_counter()
+        try:
+            return function(*args, **kwargs)
+        finally:
+            seconds = time.perf_counter() - start
+            self._depth[name] = 0
+            self._depth[stage] = stage_depth
+            self.record(self.functions, name, seconds, calls)
+            if not stage_depth:
+                self.record(self.stages, stage, seconds, calls)
+
+    def count(self, name, n=1):
+        self.counters[name] = self.counters.get(name, 0) + n
+
+    def as_dict(self):
+        return { 'wall_time': self.wall_time, 'peak_memory': self.peak_memory, 'stages': self.stages,
+                 'functions': self.functions, 'counters': self.counters }
+
+    def to_json(self, indent=4):
+        return json.dumps(self.as_dict(), indent=indent)
+
+    def write(self, target='-'):
+        '''Writes the statistics as JSON to a file name, '-' stands for sys.stderr'''
+        if target == '-':
+            print(self.to_json(), file=sys.stderr)
+        else:
+            with open(target, 'w') as f:
+                f.write(self.to_json())
+
+_active = None
+
+def _timed(function, stage, name):
+    def wrapper(*args, **kwargs):
+        stats = _active
+        if stats is None:
+            return function(*args, **kwargs)
+        result = stats.run(stage, name, function, *args, **kwargs)
+        if isinstance(result, types.GeneratorType):
+            return _timed_generator(result, stats, stage, name)
+        return result
+    wrapper.__wrapped__ = function
+    wrapper.__name__ = function.__name__
+    wrapper.__doc__ = function.__doc__
+    return wrapper
+
+def _timed_generator(generator, stats, stage, name):
+    '''Adds the time of each step of a generator to the call that created it'''
+    done = object()
+    while True:
+        item = stats.run(stage, name, next, generator, done, calls=0)
+        if item is done:
+            return
+        yield item
+
+def _counted_write_element(function):
+    def wrapper(write, elem, *args):
+        if _active is not None:
+            _active.count('elements')
+        return function(write, elem, *args)
+    return wrapper
+
+def _counted_flush(function):
+    def wrapper(self):
+        if _active is not None:
+            _active.count('output_chars', self.size)
+        return function(self)
+    return wrapper
+
+def _patches():
+    '''yields (owner, attribute, wrapper) of all instruments of imported modules'''
+    for module_name, path, stage in INSTRUMENTS:
+        module = sys.modules.get(module_name)
+        if module is None:
+            continue
+        owner, _, attribute = path.rpartition('.')
+        owner = getattr(module, owner) if owner else module
+        function = owner.__dict__[attribute]
+        yield owner, attribute, function, _timed(function, stage, f'{module_name}.{path}')
+    techdraw = sys.modules['techdraw']
+    yield techdraw, '_write_element', techdraw._write_element, _counted_write_element(techdraw._write_element)
+    writer = techdraw._BufferedWriter
+    yield writer, 'flush', writer.flush, _counted_flush(writer.flush)
+
+@contextlib.contextmanager
+def profile(memory=True):
+    '''Records the stages of all rendering inside of the block, yields the Stats
+
+    With memory the peak allocation is traced with tracemalloc, which slows down the rendering.
+    '''
+    global _active
+    if _active is not None:
+        raise RuntimeError('profile() blocks must not be nested')
+    stats = Stats()
+    patches = list(_patches())
+    for owner, attribute, _, wrapper in patches:
+        setattr(owner, attribute, wrapper)
+    tracing = memory and not tracemalloc.is_tracing()
+    if tracing:
+        tracemalloc.start()
+    _active = stats
+    start = time.perf_counter()
+    try:
+        yield stats
+    finally:
+        stats.wall_time = time.perf_counter() - start
+        _active = None
+        if tracing:
+            stats.peak_memory = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+        for owner, attribute, function, _ in reversed(patches):
+            setattr(owner, attribute, function)
+
+def output_file(filename):
+    '''Adds the size of a written file to the counter output_bytes of the active profile'''
+    if _active is not None and isinstance(filename, (str, os.PathLike)) and os.path.exists(filename):
+        _active.count('output_bytes', os.path.getsize(filename))
+
+def disable():
+    '''Stops recording in a forked worker process that inherited an active profile'''
+    global _active
+    _active = None
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+def start(target):
+    '''Starts profiling for a command line tool with the option --profile
+
+    The statistics are written as JSON to the file target ('-' for sys.stderr) when the process exits.
+    Nothing is done if target is None.
+    '''
+    if target is None:
+        return None
+    block = profile()
+    stats = block.__enter__()
+    def stop():
+        block.__exit__(None, None, None)
+        stats.write(target)
+    atexit.register(stop)
+    return stats
@@ -0,0 +1,616 @@
+'''Rasterizer for PNG previews of techdraw images
+
+The content of an Image, or of an SVG file written by techdraw, is drawn directly
+from its geometry into a NumPy buffer and written as PNG file with zlib from the standard library.
+
+Supported are the elements g, path, line, circle, ellipse, rect, polyline, polygon and use,
+the path commands M, L, H, V, C, S, Q, T, A and Z (absolute and relative),
+the transforms matrix, translate, scale, rotate, skewX and skewY
+and the attributes fill, fill-rule, fill-opacity, stroke, stroke-width, stroke-opacity and opacity.
+Text is not drawn, dashed lines are drawn solid and all lines get square caps.
+Strokes are at least MIN_STROKE_WIDTH pixels wide, so that thin lines remain visible in thumbnails.
+
+Example:
+
+    img = GearWheel(2, 30).svg_image()
+    raster.write_png('gear.png', raster.rasterize(img, size=128))
+
+As command line tool it converts SVG files to PNG files:
+
+    python -m techdraw.raster gear.svg spirographs/ -s 256 -o previews
+'''
+
+import os
+import re
+import sys
+import gzip
+import math
+import time
+import zlib
+import struct
+import argparse
+from concurrent.futures import ProcessPoolExecutor
+import numpy as np
+import xml.etree.ElementTree as etree
+
+THUMBNAIL_SIZE = 128    # length of the longer side in pixels
+SUPERSAMPLING = 3       # samples per pixel in each direction for anti-aliasing
+FLATNESS = 0.2          # maximal distance of flattened curves from the exact curves in pixels
+MIN_STROKE_WIDTH = 1.0  # in pixels
+PNG_COMPRESSLEVEL = 6
+
+COLORS = {
+    'black': (0, 0, 0), 'white': (255, 255, 255), 'silver': (192, 192, 192),
+    'gray': (128, 128, 128), 'grey': (128, 128, 128), 'lightgray': (211, 211, 211), 'lightgrey': (211, 211, 211),
+    'darkgray': (169, 169, 169), 'darkgrey': (169, 169, 169), 'red': (255, 0, 0), 'maroon': (128, 0, 0),
+    'green': (0, 128, 0), 'lime': (0, 255, 0), 'olive': (128, 128, 0), 'yellow': (255, 255, 0),
+    'blue': (0, 0, 255), 'navy': (0, 0, 128), 'teal': (0, 128, 128), 'cyan': (0, 255, 255), 'aqua': (0, 255, 255),
+    'purple': (128, 0, 128), 'magenta': (255, 0, 255), 'fuchsia': (255, 0, 255), 'orange': (255, 165, 0),
+    'brown': (165, 42, 42),
+}
+
+# presentation attributes that are inherited from the parent elements, with their initial values
+INHERITED = {
+    'fill': 'black', 'fill-rule': 'nonzero', 'fill-opacity': '1',
+    'stroke': 'none', 'stroke-width': '1', 'stroke-opacity': '1',
+}
+
+# elements that are not drawn where they appear
+SKIPPED = {'defs', 'symbol', 'style', 'desc', 'title', 'metadata', 'text', 'clipPath', 'mask', 'marker'}
+
+BINOMIALS = {2: (1, 2, 1), 3: (1, 3, 3, 1)} # coefficients of the Bernstein polynomials
+
+# number of arguments of the path commands
+PATH_ARGS = {'M': 2, 'L': 2, 'H': 1, 'V': 1, 'C': 6, 'S': 4, 'Q': 4, 'T': 2, 'A': 7, 'Z': 0}
+
+_NUMBER_PATTERN = r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?'
+_NUMBER = re.compile(_NUMBER_PATTERN)
+# a command letter and its arguments, the e of an exponent belongs to the number
+_SEGMENT = re.compile(rf'([A-Za-z])((?:[\s,]*{_NUMBER_PATTERN})*)')
+_TRANSFORM = re.compile(r'(matrix|translate|scale|rotate|skewX|skewY)\s*\(([^)]*)\)?')
+_LENGTH = re.compile(r'\s*([-+]?(?:\d+\.?\d*|\.\d+))')
+
+def parse_color(text):
+    '''returns a color as tuple (r, g, b) of floats in [0, 1], or None for none'''
+    text = (text or 'none').strip().lower()
+    if text in ('none', 'transparent'):
+        return None
+    if text.startswith('#'):
+        digits = text[1:]
+        if len(digits) == 3:
+            digits = ''.join(c * 2 for c in digits)
+        rgb = [int(digits[i:i + 2], 16) for i in (0, 2, 4)]
+    elif text.startswith('rgb('):
+        rgb = [float(v[:-1]) * 2.55 if v.endswith('%') else float(v) for v in re.split(r'[\s,]+', text[4:-1].strip())]
+    else:
+        rgb = COLORS.get(text, (0, 0, 0)) # unbekannte Farben (auch currentColor) werden schwarz
+    return tuple(min(max(v / 255, 0.0), 1.0) for v in rgb)
+
+def parse_transform(text):
+    '''returns the value of a transform attribute as 3x3 matrix'''
+    result = np.identity(3)
+    for name, args in _TRANSFORM.findall(text or ''):
+        v = [float(a) for a in _NUMBER.findall(args)]
+        m = np.identity(3)
+        if name == 'matrix':
+            m[:2] = np.reshape(v[:6], (3, 2)).T
+        elif name == 'translate':
+            m[:2, 2] = v[0], v[1] if len(v) > 1 else 0.0
+        elif name == 'scale':
+            m[0, 0], m[1, 1] = v[0], v[1] if len(v) > 1 else v[0]
+        elif name == 'rotate':
+            c, s = math.cos(math.radians(v[0])), math.sin(math.radians(v[0]))
+            m[:2, :2] = [[c, -s], [s, c]]
+            if len(v) == 3:
+                cx, cy = v[1], v[2]
+                m[:2, 2] = cx - c * cx + s * cy, cy - s * cx - c * cy
+        elif name == 'skewX':
+            m[0, 1] = math.tan(math.radians(v[0]))
+        else:
+            m[1, 0] = math.tan(math.radians(v[0]))
+        result = result @ m
+    return result
+
+def parse_length(text, default=0.0):
+    '''returns the number of a length or coordinate attribute, units are ignored'''
+    match = _LENGTH.match(text or '')
+    return float(match.group(1)) if match else default
+
+def _segment_count(r, angle, tolerance):
+    '''number of line segments for an arc with radius r, so that the deviation stays below tolerance'''
+    if r <= tolerance:
+        return max(1, math.ceil(abs(angle) / (math.pi / 2)))
+    return max(1, math.ceil(abs(angle) / (2 * math.acos(1 - tolerance / r))))
+
+def _bezier(control, tolerance):
+    '''flattens Bézier curves given as array (curves, degree + 1, 2) of control points
+
+    Returns the points of all curves without their start points.
+    '''
+    degree = control.shape[1] - 1
+    dd = control[:, 2:] - 2 * control[:, 1:-1] + control[:, :-2]
+    deviation = np.sqrt((dd**2).sum(axis=-1)).max() * degree * (degree - 1) / 8
+    n = min(max(math.ceil(math.sqrt(deviation / tolerance)), 1), 1000) if tolerance > 0 else 1
+    t = np.arange(1, n + 1) / n
+    basis = np.stack([BINOMIALS[degree][i] * t**i * (1 - t)**(degree - i) for i in range(degree + 1)], axis=-1)
+    return np.einsum('tj,kjd->ktd', basis, control).reshape(-1, 2)
+
+def _arc(x0, y0, rx, ry, rotation, large, sweep, x1, y1, tolerance):
+    '''flattens an SVG elliptical arc, returns the points without the start point'''
+    rx, ry = abs(rx), abs(ry)
+    if rx == 0 or ry == 0 or (x0 == x1 and y0 == y1):
+        return np.array([[x1, y1]])
+    # Umrechnung von Endpunkt- in Mittelpunktparametrisierung (SVG 1.1, Anhang F.6.5)
+    phi = math.radians(rotation)
+    c, s = math.cos(phi), math.sin(phi)
+    dx, dy = (x0 - x1) / 2, (y0 - y1) / 2
+    x1p, y1p = c * dx + s * dy, -s * dx + c * dy
+    scale = x1p**2 / rx**2 + y1p**2 / ry**2
+    if scale > 1:
+        rx, ry = rx * math.sqrt(scale), ry * math.sqrt(scale)
+    num = rx**2 * ry**2 - rx**2 * y1p**2 - ry**2 * x1p**2
+    den = rx**2 * y1p**2 + ry**2 * x1p**2
+    coef = math.sqrt(max(num / den, 0.0))
+    if bool(large) == bool(sweep):
+        coef = -coef
+    cxp, cyp = coef * rx * y1p / ry, -coef * ry * x1p / rx
+    cx, cy = c * cxp - s * cyp + (x0 + x1) / 2, s * cxp + c * cyp + (y0 + y1) / 2
+    ux, uy = (x1p - cxp) / rx, (y1p - cyp) / ry
+    vx, vy = (-x1p - cxp) / rx, (-y1p - cyp) / ry
+    theta = math.atan2(uy, ux)
+    delta = math.atan2(ux * vy - uy * vx, ux * vx + uy * vy)
+    if sweep and delta < 0:
+        delta += 2 * math.pi
+    elif not sweep and delta > 0:
+        delta -= 2 * math.pi
+    n = _segment_count(max(rx, ry), delta, tolerance)
+    t = theta + delta * np.arange(1, n + 1) / n
+    points = np.stack((cx + rx * np.cos(t) * c - ry * np.sin(t) * s, cy + rx * np.cos(t) * s + ry * np.sin(t) * c), axis=-1)
+    points[-1] = x1, y1
+    return points
+
+def _ellipse(cx, cy, rx, ry, tolerance):
+    n = max(_segment_count(max(rx, ry), 2 * math.pi, tolerance), 8)
+    t = 2 * math.pi * np.arange(n) / n
+    return np.stack((cx + rx * np.cos(t), cy + ry * np.sin(t)), axis=-1)
+
+def _smooth(values, x, y, relative, previous):
+    '''returns the absolute control points of smooth curves (S or T) as of curves C or Q
+
+    values is an array (curves, points, 2) of the arguments, previous is the last
+    control point of the preceding curve of the same kind or None.
+    The first control point is the reflection of the previous one at the current point.
+    '''
+    control = []
+    for points in values.tolist():
+        if relative:
+            points = [[px + x, py + y] for px, py in points]
+        first = [2 * x - previous[0], 2 * y - previous[1]] if previous is not None else [x, y]
+        control.append([first, *points])
+        previous = control[-1][-2]
+        x, y = points[-1]
+    return np.array(control)
+
+def path_polylines(d, tolerance=0.01):
+    '''returns the sub paths of SVG path data as list of tuples (points, closed)
+
+    Curves and arcs are replaced by polylines that deviate at most by tolerance.
+    Consecutive commands of the same kind are converted together in one vectorized step.
+    '''
+    segments = _SEGMENT.findall(d)
+    commands = [command for command, _ in segments]
+    texts = [text for _, text in segments]
+    result = []
+    pieces = [] # arrays of points of the current sub path
+    x = y = sx = sy = 0.0
+    curve = None # kind (C or Q) and last control point of the preceding curve
+
+    def finish(closed):
+        if pieces:
+            result.append((np.concatenate(pieces), closed))
+            pieces.clear()
+
+    i = 0
+    while i < len(commands):
+        command = commands[i]
+        upper = command.upper()
+        if upper not in PATH_ARGS:
+            raise ValueError(f'unsupported path command {command}')
+        j = i + 1
+        if upper not in 'MAZ':
+            while j < len(commands) and commands[j] == command:
+                j += 1
+        values = np.array(_NUMBER.findall(' '.join(texts[i:j])), dtype=float)
+        i = j
+        relative = command != upper
+        previous, curve = curve, None
+        if upper == 'Z':
+            finish(True)
+            x, y = sx, sy
+            continue
+        n = PATH_ARGS[upper]
+        values = values[:len(values) // n * n].reshape(-1, n)
+        if len(values) == 0:
+            continue
+        if upper == 'M':
+            finish(False)
+            points = np.cumsum(values, axis=0) + (x, y) if relative else values
+            sx, sy = points[0]
+        else:
+            if not pieces:
+                pieces.append(np.array([[x, y]]))
+            if upper in 'LHV':
+                if upper == 'L':
+                    points = np.cumsum(values, axis=0) + (x, y) if relative else values
+                elif upper == 'H':
+                    xs = np.cumsum(values[:, 0]) + x if relative else values[:, 0]
+                    points = np.stack((xs, np.full(len(xs), y)), axis=-1)
+                else:
+                    ys = np.cumsum(values[:, 0]) + y if relative else values[:, 0]
+                    points = np.stack((np.full(len(ys), x), ys), axis=-1)
+            elif upper == 'A':
+                points = []
+                for rx, ry, rotation, large, sweep, x1, y1 in values.tolist():
+                    if relative:
+                        x1, y1 = x1 + x, y1 + y
+                    points.append(_arc(x, y, rx, ry, rotation, large, sweep, x1, y1, tolerance))
+                    x, y = x1, y1
+                points = np.concatenate(points)
+            else:
+                control = values.reshape(len(values), -1, 2)
+                kind = 'C' if upper in 'CS' else 'Q'
+                if upper in 'ST':
+                    control = _smooth(control, x, y, relative, previous[1] if previous and previous[0] == kind else None)
+                elif relative:
+                    ends = np.cumsum(control[:, -1], axis=0) + (x, y)
+                    control = control + np.concatenate(([[x, y]], ends[:-1]))[:, np.newaxis]
+                starts = np.concatenate(([[x, y]], control[:-1, -1]))
+                points = _bezier(np.concatenate((starts[:, np.newaxis], control), axis=1), tolerance)
+                curve = kind, control[-1, -2].tolist()
+        pieces.append(points)
+        x, y = points[-1]
+    finish(False)
+    return result
+
+def _transform(points, matrix):
+    return points @ matrix[:2, :2].T + matrix[:2, 2]
+
+def _polygon_edges(polygons):
+    '''returns the edges of closed polygons as array of rows (x0, y0, x1, y1)'''
+    starts = np.concatenate(polygons)
+    ends = np.concatenate([np.roll(p, -1, axis=0) for p in polygons])
+    return np.concatenate((starts, ends), axis=1)
+
+def _signed_areas(polygons):
+    return np.array([np.sum(p[:, 0] * np.roll(p[:, 1], -1) - np.roll(p[:, 0], -1) * p[:, 1]) / 2 for p in polygons])
+
+def coverage(edges, width, height, supersampling=SUPERSAMPLING, rule='nonzero'):
+    '''returns the fraction of each pixel covered by a shape as array (height, width)
+
+    edges is an array of rows (x0, y0, x1, y1, winding) in pixel coordinates,
+    the edges must form closed polygons. The winding is +1 or -1 and reverses an edge.
+    The shape is sampled supersampling x supersampling times per pixel
+    with a scanline algorithm over all edges at once.
+    '''
+    ss = supersampling
+    rows, cols = height * ss, width * ss
+    x0, y0, x1, y1, winding = (edges * (ss, ss, ss, ss, 1)).T
+    dy = y1 - y0
+    keep = dy != 0
+    x0, y0, x1, y1, winding, dy = x0[keep], y0[keep], x1[keep], y1[keep], winding[keep], dy[keep]
+    direction = np.where(dy > 0, winding, -winding).astype(np.int64)
+    # jede Kante schneidet die Zeilen, deren Mittelpunkt in [ymin, ymax) liegt
+    first = np.clip(np.ceil(np.minimum(y0, y1) - 0.5), 0, rows).astype(np.int64)
+    last = np.clip(np.ceil(np.maximum(y0, y1) - 0.5), 0, rows).astype(np.int64)
+    count = np.maximum(last - first, 0)
+    total = int(count.sum())
+    if total == 0:
+        return np.zeros((height, width), dtype=np.float32)
+    index = np.repeat(np.arange(len(count)), count)
+    row = first[index] + np.arange(total) - np.repeat(np.cumsum(count) - count, count)
+    x = x0[index] + (row + 0.5 - y0[index]) * (x1 - x0)[index] / dy[index]
+    order = np.lexsort((x, row))
+    row, x = row[order], x[order]
+    # closed polygons cross every row an even number of times with a total winding of 0,
+    # so the running sum over all rows is the winding number right of each crossing
+    if rule == 'evenodd':
+        inside = np.arange(total) % 2 == 0
+    else:
+        inside = np.cumsum(direction[index][order]) != 0
+    k = np.nonzero(inside[:-1])[0]
+    start = np.clip(np.ceil(x[k] - 0.5), 0, cols).astype(np.int64)
+    end = np.clip(np.ceil(x[k + 1] - 0.5), 0, cols).astype(np.int64)
+    size = rows * (cols + 1)
+    diff = np.bincount(row[k] * (cols + 1) + start, minlength=size) - np.bincount(row[k] * (cols + 1) + end, minlength=size)
+    mask = np.cumsum(diff.reshape(rows, cols + 1)[:, :cols], axis=1) > 0
+    return mask.reshape(height, ss, width, ss).mean(axis=(1, 3), dtype=np.float32)
+
+class Rasterizer:
+    '''Draws SVG elements into an RGBA buffer of floats with premultiplied alpha
+
+    Opaque shapes of the same color that are drawn one after the other are collected
+    and drawn in one step, e.g. all lines and dots of a drawing in black.
+    '''
+
+    def __init__(self, width, height, background='white', supersampling=SUPERSAMPLING,
+                 flatness=FLATNESS, min_stroke_width=MIN_STROKE_WIDTH):
+        self.width, self.height = width, height
+        self.pixels = np.zeros((height, width, 4), dtype=np.float32)
+        color = parse_color(background)
+        if color is not None:
+            self.pixels[...] = (*color, 1.0)
+        self.supersampling = supersampling
+        self.flatness = flatness
+        self.min_stroke_width = min_stroke_width
+        self.pending_color = None
+        self.pending = [] # edges of the collected shapes
+        self.ids = {}
+
+    def draw_root(self, root, matrix):
+        '''draws the children of an svg element'''
+        self.ids = {e.get('id'): e for e in root.iter() if e.get('id') is not None}
+        style = _style(root, INHERITED)
+        for child in root:
+            self.draw(child, matrix, style)
+        self.flush()
+
+    def draw(self, elem, matrix, style, used=()):
+        tag = elem.tag.rpartition('}')[2] if isinstance(elem.tag, str) else ''
+        if tag in SKIPPED or not tag:
+            return
+        if elem.get('transform'):
+            matrix = matrix @ parse_transform(elem.get('transform'))
+        style = _style(elem, style)
+        if tag in ('g', 'svg', 'a'):
+            for child in elem:
+                self.draw(child, matrix, style, used)
+        elif tag == 'use':
+            href = elem.get('href') or elem.get('xlink:href') or elem.get('{http://www.w3.org/1999/xlink}href') or ''
+            ref = self.ids.get(href.lstrip('#'))
+            if ref is not None and href not in used:
+                offset = np.identity(3)
+                offset[:2, 2] = parse_length(elem.get('x')), parse_length(elem.get('y'))
+                if ref.tag.rpartition('}')[2] == 'symbol':
+                    for child in ref:
+                        self.draw(child, matrix @ offset, _style(ref, style), used + (href,))
+                else:
+                    self.draw(ref, matrix @ offset, style, used + (href,))
+        else:
+            self.draw_shape(elem, matrix, style)
+
+    def draw_shape(self, elem, matrix, style):
+        tag = elem.tag.rpartition('}')[2]
+        scale = math.sqrt(abs(np.linalg.det(matrix[:2, :2]))) or 1.0
+        tolerance = self.flatness / scale
+        normalized = False # True if the winding of the shape does not matter
+        get = lambda name: parse_length(elem.get(name))
+        if tag == 'path':
+            d = elem.get('d') or ''
+            paths = path_polylines(d if isinstance(d, str) else ''.join(d), tolerance)
+        elif tag == 'line':
+            paths = [(np.array([[get('x1'), get('y1')], [get('x2'), get('y2')]]), False)]
+        elif tag in ('circle', 'ellipse'):
+            rx = get('r') if tag == 'circle' else get('rx')
+            ry = get('r') if tag == 'circle' else get('ry')
+            paths = [(_ellipse(get('cx'), get('cy'), rx, ry, tolerance), True)] if rx > 0 and ry > 0 else []
+            normalized = True
+        elif tag == 'rect':
+            x, y, w, h = get('x'), get('y'), get('width'), get('height')
+            paths = [(np.array([[x, y], [x + w, y], [x + w, y + h], [x, y + h]]), True)] if w > 0 and h > 0 else []
+            normalized = True
+        elif tag in ('polyline', 'polygon'):
+            values = np.array(_NUMBER.findall(elem.get('points') or ''), dtype=float)
+            paths = [(values[:len(values) // 2 * 2].reshape(-1, 2), tag == 'polygon')]
+        else:
+            return
+        paths = [(_transform(points, matrix), closed) for points, closed in paths if len(points)]
+        if not paths:
+            return
+        opacity = float(style['opacity'])
+        fill = parse_color(style['fill'])
+        if fill is not None and tag != 'line':
+            polygons = [points for points, _ in paths if len(points) > 2]
+            if polygons:
+                edges = _polygon_edges(polygons)
+                if normalized:
+                    winding = np.repeat(np.sign(_signed_areas(polygons)), [len(p) for p in polygons])
+                else:
+                    winding = np.ones(len(edges))
+                self.paint(np.column_stack((edges, winding)), fill, opacity * float(style['fill-opacity']),
+                           style['fill-rule'], normalized)
+        stroke = parse_color(style['stroke'])
+        if stroke is not None:
+            width = max(parse_length(style['stroke-width'], 1.0) * scale, self.min_stroke_width)
+            self.paint(_stroke_edges(paths, width), stroke, opacity * float(style['stroke-opacity']), 'nonzero', True)
+
+    def paint(self, edges, color, opacity, rule='nonzero', normalized=False):
+        '''draws a shape given by its edges in pixel coordinates, see coverage()
+
+        Normalized shapes have a positive winding number everywhere inside.
+        '''
+        edges = edges[np.isfinite(edges).all(axis=1)]
+        if opacity >= 1 and normalized and rule == 'nonzero':
+            if self.pending_color != color:
+                self.flush()
+                self.pending_color = color
+            self.pending.append(edges)
+            return
+        self.flush()
+        self.composite(edges, color, opacity, rule)
+
+    def flush(self):
+        '''draws the collected shapes'''
+        if self.pending:
+            self.composite(np.concatenate(self.pending), self.pending_color, 1.0, 'nonzero')
+        self.pending = []
+        self.pending_color = None
+
+    def composite(self, edges, color, opacity, rule):
+        if len(edges) == 0 or opacity <= 0:
+            return
+        xs, ys = edges[:, [0, 2]], edges[:, [1, 3]]
+        left, right = max(math.floor(xs.min()), 0), min(math.ceil(xs.max()), self.width)
+        top, bottom = max(math.floor(ys.min()), 0), min(math.ceil(ys.max()), self.height)
+        if left >= right or top >= bottom:
+            return
+        alpha = coverage(edges - (left, top, left, top, 0), right - left, bottom - top, self.supersampling, rule)
+        alpha = (alpha * opacity)[..., np.newaxis]
+        region = self.pixels[top:bottom, left:right]
+        region *= 1 - alpha
+        region += alpha * np.array((*color, 1.0), dtype=np.float32)
+
+    def result(self, alpha=True):
+        '''returns the pixels as array (height, width, 4) of uint8, or (height, width, 3) without alpha'''
+        pixels = self.pixels
+        if alpha:
+            a = pixels[..., 3:]
+            rgb = np.divide(pixels[..., :3], a, out=np.zeros_like(pixels[..., :3]), where=a > 0)
+            pixels = np.concatenate((rgb, a), axis=-1)
+        else:
+            pixels = pixels[..., :3]
+        return np.rint(np.clip(pixels, 0, 1) * 255).astype(np.uint8)
+
+def _style(elem, inherited):
+    style = dict(inherited)
+    for key in INHERITED:
+        value = elem.get(key)
+        if value is not None:
+            style[key] = value
+    for declaration in (elem.get('style') or '').split(';'):
+        key, _, value = declaration.partition(':')
+        if key.strip() in INHERITED:
+            style[key.strip()] = value.strip()
+    # die Deckkraft einer Gruppe wird auf ihre Elemente verteilt
+    style['opacity'] = float(inherited.get('opacity', 1.0)) * float(elem.get('opacity') or 1.0)
+    return style
+
+def _stroke_edges(paths, width):
+    '''returns the edges of a rectangle around each line segment of the polylines'''
+    segments = []
+    for points, closed in paths:
+        if len(points) == 1:
+            points = np.concatenate((points, points))
+        if closed:
+            points = np.concatenate((points, points[:1]))
+        segments.append(np.concatenate((points[:-1], points[1:]), axis=1))
+    segments = np.concatenate(segments)
+    p, q = segments[:, :2], segments[:, 2:]
+    d = q - p
+    length = np.sqrt((d**2).sum(axis=1))[:, np.newaxis]
+    u = np.divide(d, length, out=np.tile([1.0, 0.0], (len(d), 1)), where=length > 0) * (width / 2)
+    n = np.stack((-u[:, 1], u[:, 0]), axis=-1)
+    p, q = p - u, q + u # square caps, they also close the gaps at the joints
+    corners = np.stack((p + n, q + n, q - n, p - n), axis=1)
+    edges = np.concatenate((corners, np.roll(corners, -1, axis=1)), axis=2).reshape(-1, 4)
+    # the rectangles have a negative signed area, the winding -1 normalizes them
+    return np.column_stack((edges, np.full(len(edges), -1.0)))
+
+def rasterize(image, size=THUMBNAIL_SIZE, background='white', supersampling=SUPERSAMPLING,
+              flatness=FLATNESS, min_stroke_width=MIN_STROKE_WIDTH):
+    '''draws an Image, an svg element or an ElementTree into an array of uint8
+
+    size is the length of the longer side in pixels, the aspect ratio of the viewBox is kept.
+    Returns an array (height, width, 3), or (height, width, 4) with alpha if background is None.
+    '''
+    root = image.getroot() if hasattr(image, 'getroot') else image
+    box = [float(v) for v in _NUMBER.findall(root.get('viewBox') or '')]
+    if len(box) != 4:
+        box = [0.0, 0.0, parse_length(root.get('width'), 100.0), parse_length(root.get('height'), 100.0)]
+    x, y, w, h = box
+    scale = size / max(w, h)
+    width, height = max(round(w * scale), 1), max(round(h * scale), 1)
+    matrix = np.array([[scale, 0, -x * scale], [0, scale, -y * scale], [0, 0, 1]])
+    rasterizer = Rasterizer(width, height, background, supersampling, flatness, min_stroke_width)
+    rasterizer.draw_root(root, matrix)
+    return rasterizer.result(alpha=background is None)
+
+def _png_chunk(tag, data):
+    return struct.pack('>I', len(data)) + tag + data + struct.pack('>I', zlib.crc32(tag + data) & 0xffffffff)
+
+def png_bytes(pixels, compresslevel=PNG_COMPRESSLEVEL):
+    '''encodes an array (height, width) or (height, width, channels) of uint8 as PNG
+
+    1 channel is grey, 2 grey with alpha, 3 RGB and 4 RGB with alpha.
+    All rows use the filter Up, which compresses drawings well.
+    '''
+    pixels = np.asarray(pixels, dtype=np.uint8)
+    if pixels.ndim == 2:
+        pixels = pixels[..., np.newaxis]
+    height, width, channels = pixels.shape
+    color_type = {1: 0, 2: 4, 3: 2, 4: 6}[channels]
+    rows = pixels.reshape(height, width * channels)
+    raw = np.empty((height, width * channels + 1), dtype=np.uint8)
+    raw[:, 0] = 2
+    raw[0, 1:] = rows[0]
+    raw[1:, 1:] = rows[1:] - rows[:-1] # uint8 rechnet modulo 256, wie der Filter es verlangt
+    header = struct.pack('>IIBBBBB', width, height, 8, color_type, 0, 0, 0)
+    return b''.join((b'\x89PNG\r\n\x1a\n', _png_chunk(b'IHDR', header),
+                     _png_chunk(b'IDAT', zlib.compress(raw.tobytes(), compresslevel)), _png_chunk(b'IEND', b'')))
+
+def write_png(file, pixels, compresslevel=PNG_COMPRESSLEVEL):
+    '''writes pixels as PNG to a file name or a binary file object, see png_bytes()'''
+    data = png_bytes(pixels, compresslevel)
+    if isinstance(file, (str, os.PathLike)):
+        with open(file, 'wb') as f:
+            f.write(data)
+    else:
+        file.write(data)
+
+def thumbnail(image, file, size=THUMBNAIL_SIZE, background='white'):
+    '''writes a PNG preview of an Image'''
+    write_png(file, rasterize(image, size, background))
+
+def read_svg(filename):
+    '''parses an SVG or compressed SVGZ file'''
+    opener = gzip.open if filename.lower().endswith('.svgz') else open
+    with opener(filename, 'rb') as f:
+        return etree.parse(f)
+
+def input_files(names):
+    '''yields the SVG files of the names, directories are searched for .svg and .svgz files'''
+    for name in names:
+        if os.path.isdir(name):
+            for entry in sorted(os.listdir(name)):
+                if os.path.splitext(entry)[1].lower() in ('.svg', '.svgz'):
+                    yield os.path.join(name, entry)
+        else:
+            yield name
+
+def convert(filename, directory=None, size=THUMBNAIL_SIZE, background='white'):
+    '''converts an SVG file to a PNG file, returns the name of the PNG file'''
+    output = os.path.splitext(filename)[0] + '.png'
+    if directory is not None:
+        output = os.path.join(directory, os.path.basename(output))
+    thumbnail(read_svg(filename), output, size, background)
+    return output
+
+if __name__ == "__main__":
+    PROG = 'python -m techdraw.raster'
+    parser = argparse.ArgumentParser(prog=PROG, description='Converts SVG files to PNG previews.')
+    parser.add_argument('files', type=str, nargs='+', help='SVG files or directories with SVG files')
+    parser.add_argument('-s', '--size', type=int, help=f'length of the longer side in pixels (default: {THUMBNAIL_SIZE})', default=THUMBNAIL_SIZE)
+    parser.add_argument('-o', '--output', type=str, help='output directory (default: next to the SVG file)', default=None)
+    parser.add_argument('-b', '--background', type=str, help='background color, none for transparency (default: white)', default='white')
+    parser.add_argument('-j', '--jobs', type=int, help='number of worker processes (default: number of CPUs)', default=None)
+    args = parser.parse_args()
+
+    files = list(input_files(args.files))
+    if args.output is not None:
+        os.makedirs(args.output, exist_ok=True)
+    background = None if args.background == 'none' else args.background
+    start = time.perf_counter()
+    failed = 0
+    with ProcessPoolExecutor(max_workers=args.jobs) as pool:
+        futures = [pool.submit(convert, filename, args.output, args.size, background) for filename in files]
+        for filename, future in zip(files, futures):
+            try:
+                future.result()
+            except Exception as error:
+                failed += 1
+                print(f'{PROG}: {filename}: {error}', file=sys.stderr)
+    elapsed = time.perf_counter() - start
+
+    done = len(files) - failed
+    print(f'{done} of {len(files)} files converted in {elapsed:.2f} s ({done / elapsed if elapsed else 0:.1f} per second)', file=sys.stderr)
+    if failed:
+        sys.exit(1)
@@ -0,0 +1,352 @@
+'''HTTP render service for gear wheels and spirographs
+
+A small HTTP/1.1 server built on asyncio of the standard library.
+It keeps the interpreter, NumPy and a pool of worker processes running,
+so a request does not pay their start-up cost.
+
++--------+-------------+-----------------------------------------------------------+
+| Method | Path        | Description                                               |
++--------+-------------+-----------------------------------------------------------+
+| POST   | /spirograph | body in the JSON format of ``spirograph.compile``,        |
+|        |             | i.e. one spirograph object or an array of them            |
++--------+-------------+-----------------------------------------------------------+
+| POST   | /gearwheel  | body is a JSON object with ``modul``, ``teeth``, ``pitch``|
+|        |             | as in ``gearwheel.batch`` and an optional ``instancing``  |
++--------+-------------+-----------------------------------------------------------+
+| GET    | /metrics    | JSON object with request counters, latencies and          |
+|        |             | throughput since the start of the server                  |
++--------+-------------+-----------------------------------------------------------+
+
+Example:
+
+    curl -d '{"ring": 105, "wheel": 50, "excenter": 0.6}' http://localhost:8000/spirograph
+
+The SVG images are rendered by a bounded pool of worker processes (see option ``--jobs``).
+Identical requests that arrive while an image is rendered wait for the same result,
+and the last rendered images are kept in a response cache of bounded size (see option ``--cache-size``).
+The header ``X-Render`` of a response tells whether the image was rendered, coalesced or cached.
+
+The work of a request is limited, requests beyond the limits are answered with 413 Payload Too Large:
+
+* at most MAX_SPIROGRAPHS spirographs with at most MAX_POINTS points (estimated) in total
+* rings, wheels and gear wheels with at most MAX_TEETH teeth
+* at most MAX_SAMPLES samples per tooth and a tolerance of at least MIN_TOLERANCE
+* at most MAX_REVOLUTIONS revolutions of the wheel, a spirograph that needs more revolutions
+  to close is only drawn (open) if the request limits them with ``max_revolutions``
+
+A rendering that takes longer than the timeout (see option ``--timeout``)
+is aborted and answered with 503 Service Unavailable.
+'''
+
+import io
+import sys
+import json
+import time
+import signal
+import asyncio
+import argparse
+import statistics
+from http import HTTPStatus
+from collections import Counter, deque
+from concurrent.futures import ProcessPoolExecutor
+import techdraw as svg
+from techdraw.cache import LRUCache
+from techdraw.gearwheel import GearWheel
+from techdraw.gearwheel.batch import parse_spec
+from techdraw.spirograph import ADAPTIVE_GRID
+from techdraw.spirograph.compile import parse_hook, image
+
+RESPONSE_CACHE_SIZE = 64 # MiB of SVG images
+LATENCY_WINDOW = 1000 # number of requests of the latency statistics
+MAX_BODY_SIZE = 1024 * 1024 # bytes
+CHUNK_SIZE = 64 * 1024 # bytes
+RENDER_TIMEOUT = 30.0 # seconds
+
+# limits of the work of a request
+MAX_SPIROGRAPHS = 64 # spirographs per request
+MAX_POINTS = 2000000 # points of all spirographs of a request
+MAX_TEETH = 2000 # teeth of a ring, wheel or gear wheel
+MAX_SAMPLES = 64 # samples per tooth
+MIN_TOLERANCE = 0.001 # mm
+MAX_REVOLUTIONS = 100 # revolutions of the wheel of a spirograph
+
+# exceptions of invalid parameters, they are answered with 400 Bad Request
+CLIENT_ERRORS = (ValueError, KeyError, TypeError, ArithmeticError)
+
+class HTTPError(Exception):
+    def __init__(self, status, message=None):
+        super().__init__(message or status.phrase)
+        self.status = status
+
+def worker():
+    '''Initializes a worker process, Ctrl+C only stops the server'''
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    if hasattr(signal, 'SIGALRM'):
+        signal.signal(signal.SIGALRM, timed_out)
+
+def timed_out(signum, frame):
+    raise TimeoutError('rendering took too long')
+
+def run(timeout, function, *args):
+    '''runs a rendering job in a worker process, it is aborted with TimeoutError after timeout seconds'''
+    timer = timeout is not None and hasattr(signal, 'setitimer')
+    if timer:
+        signal.setitimer(signal.ITIMER_REAL, timeout)
+    try:
+        return function(*args)
+    finally:
+        if timer:
+            signal.setitimer(signal.ITIMER_REAL, 0)
+
+def too_large(message):
+    return HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, message)
+
+def limit_spirograph(spirograph):
+    '''checks a spirograph against the limits and returns the estimated number of points'''
+    if spirograph.max_revolutions is not None and spirograph.max_revolutions > MAX_REVOLUTIONS:
+        raise too_large(f'max_revolutions is limited to {MAX_REVOLUTIONS}')
+    if spirograph.revolutions() > MAX_REVOLUTIONS:
+        raise too_large(f'the spirograph needs {spirograph.revolutions()} revolutions to close, '
+                        f'they are limited to {MAX_REVOLUTIONS}, set max_revolutions to draw it open')
+    if spirograph.ring > MAX_TEETH or abs(spirograph.wheel) > MAX_TEETH:
+        raise too_large(f'ring and wheel are limited to {MAX_TEETH} teeth')
+    if spirograph.samples > MAX_SAMPLES:
+        raise too_large(f'samples are limited to {MAX_SAMPLES}')
+    if spirograph.tolerance is not None and spirograph.tolerance < MIN_TOLERANCE:
+        raise too_large(f'tolerance is limited to {MIN_TOLERANCE}')
+    adaptive = spirograph.tolerance is not None or spirograph.curves
+    return spirograph.revolutions() * spirograph.ring * (ADAPTIVE_GRID if adaptive else spirograph.samples)
+
+def svg_bytes(img, output_format=None):
+    '''returns the SVG image as UTF-8 encoded bytes'''
+    f = io.BytesIO()
+    img.write(f, output_format=output_format)
+    return f.getvalue()
+
+def spirograph_svg(data, output_format=None):
+    '''renders the list of tuples (Spirograph, attrib), runs in a worker process'''
+    return svg_bytes(image('request', data, [spirograph.svg_path() for spirograph, _ in data]), output_format)
+
+def gearwheel_svg(gear_wheel, instancing=False, output_format=None):
+    '''renders a GearWheel, runs in a worker process'''
+    return svg_bytes(gear_wheel.svg_image(instancing), output_format)
+
+def parse_spirograph(body):
+    '''returns the cache key and the rendering job of a spirograph request'''
+    data = json.loads(body, object_hook=parse_hook)
+    if isinstance(data, tuple):
+        data = [data]
+    if not isinstance(data, list) or not all(isinstance(item, tuple) for item in data):
+        raise ValueError('expected a spirograph object or an array of spirograph objects')
+    if len(data) > MAX_SPIROGRAPHS:
+        raise too_large(f'at most {MAX_SPIROGRAPHS} spirographs per request')
+    for _, attrib in data:
+        for name, value in attrib.items():
+            if not isinstance(value, str):
+                raise ValueError(f'value of the SVG attribute {name} must be a string')
+    if sum(limit_spirograph(spirograph) for spirograph, _ in data) > MAX_POINTS:
+        raise too_large(f'at most {MAX_POINTS} points per request')
+    key = json.dumps(['spirograph', [[spirograph.params(), attrib] for spirograph, attrib in data]], sort_keys=True)
+    return key, spirograph_svg, (data,)
+
+def parse_gearwheel(body):
+    '''returns the cache key and the rendering job of a gear wheel request'''
+    spec = json.loads(body)
+    if not isinstance(spec, dict):
+        raise ValueError('expected a gear wheel object')
+    modul, teeth, pitch = parse_spec(spec)
+    if modul <= 0 or teeth < 1:
+        raise ValueError('modul and teeth must be positive')
+    if teeth > MAX_TEETH:
+        raise too_large(f'teeth are limited to {MAX_TEETH}')
+    instancing = bool(spec.get('instancing', False))
+    gear_wheel = GearWheel(modul, teeth, svg.radians(pitch))
+    key = json.dumps(['gearwheel', gear_wheel.params(), instancing], sort_keys=True)
+    return key, gearwheel_svg, (gear_wheel, instancing)
+
+ROUTES = {
+    '/spirograph': parse_spirograph,
+    '/gearwheel': parse_gearwheel,
+}
+
+class Metrics:
+    '''Counters and latencies of the handled requests'''
+
+    def __init__(self, window=LATENCY_WINDOW):
+        self.start = time.monotonic()
+        self.requests = 0
+        self.status = Counter()
+        self.render = Counter()
+        self.latencies = deque(maxlen=window)
+
+    def record(self, status, seconds, render=None):
+        self.requests += 1
+        self.status[int(status)] += 1
+        if render is not None:
+            self.render[render] += 1
+        self.latencies.append(seconds)
+
+    def to_dict(self):
+        uptime = time.monotonic() - self.start
+        latencies = sorted(self.latencies)
+        result = { 'uptime': uptime, 'requests': self.requests,
+                   'requests_per_second': self.requests / uptime if uptime else 0.0,
+                   'status': dict(self.status), 'render': dict(self.render) }
+        if latencies:
+            result['latency_ms'] = {
+                'mean': statistics.mean(latencies) * 1e3,
+                'p50': latencies[len(latencies) // 2] * 1e3,
+                'p95': latencies[min(len(latencies) - 1, int(len(latencies) * 0.95))] * 1e3,
+                'max': latencies[-1] * 1e3,
+            }
+        return result
+
+class RenderServer:
+    '''Renders SVG images on a process pool with request coalescing and a response cache'''
+
+    def __init__(self, pool, output_format=None, cache_size=RESPONSE_CACHE_SIZE, timeout=RENDER_TIMEOUT):
+        self.pool = pool
+        self.output_format = output_format
+        self.timeout = timeout
+        self.responses = LRUCache(None, maxbytes=cache_size * 1024 * 1024)
+        self.inflight = {}
+        self.metrics = Metrics()
+
+    async def render(self, key, function, args):
+        '''returns the SVG image and how it was obtained: rendered, coalesced or cached'''
+        if key in self.responses:
+            return self.responses.get(key, None), 'cached'
+        future = self.inflight.get(key)
+        if future is not None:
+            return await self._result(future), 'coalesced'
+        future = asyncio.get_running_loop().run_in_executor(self.pool, run, self.timeout, function, *args, self.output_format)
+        self.inflight[key] = future
+        future.add_done_callback(lambda future: self._rendered(key, future))
+        return await self._result(future), 'rendered'
+
+    async def _result(self, future):
+        # shield() keeps the job running for the other requests if this client disconnects,
+        # the worker aborts the job itself after the timeout, waiting for it is limited in case it is queued
+        try:
+            return await asyncio.wait_for(asyncio.shield(future), self.timeout)
+        except (TimeoutError, asyncio.TimeoutError):
+            raise HTTPError(HTTPStatus.SERVICE_UNAVAILABLE, 'rendering timed out')
+
+    def _rendered(self, key, future):
+        del self.inflight[key]
+        if not future.cancelled() and future.exception() is None:
+            self.responses.put(key, future.result())
+
+    async def handle(self, method, path, body):
+        '''returns status, content type, body and the render mode of a request'''
+        path = path.split('?', 1)[0]
+        if path == '/metrics':
+            if method != 'GET':
+                raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED)
+            metrics = { **self.metrics.to_dict(), 'inflight': len(self.inflight), 'cache': self.responses.stats() }
+            return HTTPStatus.OK, 'application/json', json.dumps(metrics, indent=2).encode('utf-8'), None
+        parse = ROUTES.get(path)
+        if parse is None:
+            raise HTTPError(HTTPStatus.NOT_FOUND)
+        if method != 'POST':
+            raise HTTPError(HTTPStatus.METHOD_NOT_ALLOWED)
+        try:
+            key, function, args = parse(body)
+            result, render = await self.render(key, function, args)
+        except KeyError as error:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, str(error.args[0]))
+        except CLIENT_ERRORS as error:
+            raise HTTPError(HTTPStatus.BAD_REQUEST, str(error))
+        return HTTPStatus.OK, 'image/svg+xml', result, render
+
+    async def connection(self, reader, writer):
+        '''serves the requests of one connection, it is kept alive as long as the client wants'''
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                keep_alive = await self.request(request_line, reader, writer)
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def request(self, request_line, reader, writer):
+        '''reads one request and writes its response, returns whether the connection is kept alive'''
+        start = time.perf_counter()
+        render = None
+        keep_alive = False
+        try:
+            try:
+                method, path, version = request_line.decode('latin-1').split()
+            except ValueError:
+                raise HTTPError(HTTPStatus.BAD_REQUEST, 'invalid request line')
+            headers = {}
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b'\n', b''):
+                    break
+                name, _, value = line.decode('latin-1').partition(':')
+                headers[name.strip().lower()] = value.strip()
+            connection = headers.get('connection', '').lower()
+            keep_alive = connection == 'keep-alive' if version == 'HTTP/1.0' else connection != 'close'
+            try:
+                length = int(headers.get('content-length') or 0)
+            except ValueError:
+                length = -1
+            if length < 0:
+                keep_alive = False # the body cannot be skipped
+                raise HTTPError(HTTPStatus.BAD_REQUEST, 'invalid Content-Length')
+            if length > MAX_BODY_SIZE:
+                keep_alive = False
+                raise HTTPError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE)
+            body = await reader.readexactly(length)
+            status, content_type, content, render = await self.handle(method, path, body)
+        except HTTPError as error:
+            status, content_type, content = error.status, 'text/plain; charset=utf-8', (str(error) + '\n').encode('utf-8')
+        except asyncio.CancelledError:
+            raise
+        except Exception as error:
+            print(f'techdraw.server: {error!r}', file=sys.stderr)
+            status, content_type, content = HTTPStatus.INTERNAL_SERVER_ERROR, 'text/plain; charset=utf-8', b'Internal Server Error\n'
+        header = [f'HTTP/1.1 {status.value} {status.phrase}', f'Content-Type: {content_type}', f'Content-Length: {len(content)}',
+                  'Connection: ' + ('keep-alive' if keep_alive else 'close')]
+        if render is not None:
+            header.append(f'X-Render: {render}')
+        writer.write(('\r\n'.join(header) + '\r\n\r\n').encode('latin-1'))
+        for offset in range(0, len(content), CHUNK_SIZE):
+            writer.write(content[offset:offset + CHUNK_SIZE])
+            await writer.drain()
+        self.metrics.record(status, time.perf_counter() - start, render)
+        return keep_alive
+
+async def serve(host, port, pool, output_format=None, cache_size=RESPONSE_CACHE_SIZE, timeout=RENDER_TIMEOUT):
+    '''runs the render service until it is cancelled'''
+    server = RenderServer(pool, output_format, cache_size, timeout)
+    async with await asyncio.start_server(server.connection, host, port) as listener:
+        for sock in listener.sockets:
+            print('techdraw.server: listening on {}:{}'.format(*sock.getsockname()[:2]), file=sys.stderr)
+        await listener.serve_forever()
+
+if __name__ == "__main__":
+    PROG = 'python -m techdraw.server'
+    parser = argparse.ArgumentParser(prog=PROG, description='HTTP service that renders gear wheels and spirographs to SVG.')
+    parser.add_argument('--host', type=str, help='address to listen on (default: 127.0.0.1)', default='127.0.0.1')
+    parser.add_argument('-p', '--port', type=int, help='port to listen on (default: 8000)', default=8000)
+    parser.add_argument('-j', '--jobs', type=int, help='number of worker processes (default: number of CPUs)', default=None)
+    parser.add_argument('--cache-size', type=int, metavar='MIB', help=f'size of the SVG images kept in the response cache in MiB (default: {RESPONSE_CACHE_SIZE})', default=RESPONSE_CACHE_SIZE)
+    parser.add_argument('--timeout', type=float, metavar='SECONDS', help=f'max. time to render an image (default: {RENDER_TIMEOUT})', default=RENDER_TIMEOUT)
+    parser.add_argument('--compact', action='store_true', help='write relative path commands without redundant whitespace and zeros')
+    parser.add_argument('--precision', type=svg.OutputFormat.precision_option, help='number of decimals of coordinates', default=None)
+    args = parser.parse_args()
+
+    output_format = svg.OutputFormat.create(args.compact, args.precision)
+    with ProcessPoolExecutor(max_workers=args.jobs, initializer=worker) as pool:
+        try:
+            asyncio.run(serve(args.host, args.port, pool, output_format, args.cache_size, args.timeout))
+        except KeyboardInterrupt:
+            pass
@@ -1,20 +1,30 @@
 
 import math
+import numpy as np
 import techdraw as svg
 
+CHUNK_SIZE = 4096
+ADAPTIVE_GRID = 16 # grid points per tooth to integrate the sample density of adaptive sampling
+DEFAULT_TOLERANCE = 0.01 # tolerance of Bézier curves if no tolerance is set
+BEZIER_DEPTH = 16 # max. number of times a Bézier segment is split
+ADAPTIVE_DEPTH = 16 # max. number of times a chord of the adaptive sampling is split
+CHORD_SAMPLES = np.arange(1, 8) / 8 # parameters of the points where the deviation of a chord is measured
+CHORD_MARGIN = 0.95 # share of the tolerance the measured deviation may use, the curve deviates a little more between the samples
+
 def ggt(a: int, b: int) -> int:
-    if b == 0: return 1
-    if a > b:  return ggt(a - b, b)
-    if a < b:  return ggt(a, b - a)
-    return a
+    '''greatest common divisor (größter gemeinsamer Teiler)'''
+    return math.gcd(a, b)
 
 def kgv(a: int, b: int) -> int:
-    return int(a * b / ggt(a, b))
+    '''least common multiple (kleinstes gemeinsames Vielfaches), exact for integers of any size'''
+    if a == 0 or b == 0:
+        return 0
+    return abs(a * b) // math.gcd(a, b)
 
 class Spirograph:
     '''draws spirographs'''
 
-    def __init__(self, ring: int, wheel: int, excenter=0.8, offset=0, samples=1):
+    def __init__(self, ring: int, wheel: int, excenter=0.8, offset=0, samples=1, tolerance=None, curves=False, max_revolutions=None):
         self.ring = int(ring)
         if self.ring < 1:
             raise ValueError('ring must be > 0')
@@ -33,8 +43,26 @@ class Spirograph:
         if samples < 1:
             raise ValueError('samples must be > 0')
 
+        self.tolerance = tolerance
+        if tolerance is not None and tolerance <= 0.0:
+            raise ValueError('tolerance must be > 0')
+        self.curves = curves
+
+        # limits the revolutions of the wheel, the spirograph stays open if it needs more
+        self.max_revolutions = max_revolutions
+        if max_revolutions is not None:
+            self.max_revolutions = int(max_revolutions)
+            if self.max_revolutions < 1:
+                raise ValueError('max_revolutions must be > 0')
+
         self.modul = 1
 
+    def params(self):
+        '''returns the normalized parameters as dict, e.g. as key of a cache'''
+        return { 'ring': self.ring, 'wheel': self.wheel, 'excenter': float(self.excenter), 'offset': self.offset,
+                 'samples': self.samples, 'tolerance': self.tolerance, 'curves': bool(self.curves),
+                 'max_revolutions': self.max_revolutions, 'modul': self.modul }
+
     def r_ring(self):
         return self.modul * self.ring / 2
 
@@ -50,14 +78,26 @@ class Spirograph:
             result -= (1.0 + self.excenter) * self.r_wheel()
         return result
     
+    def full_revolutions(self):
+        '''returns the number of revolutions of the wheel around the ring until the spirograph is closed'''
+        return abs(self.wheel) // math.gcd(self.wheel, self.ring)
+
     def revolutions(self):
-        return int(self.step_count() / self.ring / self.samples)
+        '''returns the number of revolutions that are drawn, at most max_revolutions'''
+        result = self.full_revolutions()
+        if self.max_revolutions is not None and result > self.max_revolutions:
+            result = self.max_revolutions
+        return result
+
+    def closed(self):
+        '''returns True if the drawn revolutions close the spirograph'''
+        return self.revolutions() == self.full_revolutions()
     
     def step_size(self):
         return 2 * math.pi / self.ring / self.samples
     
     def step_count(self):
-        return kgv(abs(self.wheel), abs(self.ring)) * self.samples
+        return self.revolutions() * self.ring * self.samples
 
     def tooth_pos(self, alpha):
         '''return x, y of a tooth'''
@@ -76,9 +116,144 @@ class Spirograph:
         beta = alpha - alpha / self.wheel * self.ring + self.offset
         return cx + r * math.sin(beta), cy + r * math.cos(beta)
 
+    def pen_positions(self, alpha):
+        '''returns the pen positions of an array of angles as (N, 2) array'''
+        alpha = np.asarray(alpha, dtype=float)
+        r, r_w, r_e = self.r_ring(), self.r_wheel(), self.r_excenter()
+        beta = alpha - alpha / self.wheel * self.ring + self.offset
+        sin_a, cos_a = np.sin(alpha), np.cos(alpha)
+        result = np.empty(alpha.shape + (2,))
+        result[..., 0] = r * sin_a - r_w * sin_a + r_e * np.sin(beta)
+        result[..., 1] = r * cos_a - r_w * cos_a + r_e * np.cos(beta)
+        return result
+
+    def derivatives(self, alpha):
+        '''returns the first and second derivative of the pen position by alpha as (N, 2) arrays'''
+        alpha = np.asarray(alpha, dtype=float)
+        r_c, r_e = self.r_ring() - self.r_wheel(), self.r_excenter()
+        k = 1 - self.ring / self.wheel
+        beta = k * alpha + self.offset
+        sin_a, cos_a, sin_b, cos_b = np.sin(alpha), np.cos(alpha), np.sin(beta), np.cos(beta)
+        d1 = np.empty(alpha.shape + (2,))
+        d1[..., 0] = r_c * cos_a + r_e * k * cos_b
+        d1[..., 1] = -r_c * sin_a - r_e * k * sin_b
+        d2 = np.empty(alpha.shape + (2,))
+        d2[..., 0] = -r_c * sin_a - r_e * k * k * sin_b
+        d2[..., 1] = -r_c * cos_a - r_e * k * k * cos_b
+        return d1, d2
+
+    def adaptive_angles(self, tolerance):
+        '''returns the angles of the points of an adaptive sampling
+
+        The points are placed so that the chord between two points deviates
+        about tolerance from the curve: on an arc with curvature k the deviation
+        of a chord with length l is k * l**2 / 8.
+        The step is limited to four teeth and to a hundreth of a tooth.
+        Because the density is only estimated on a grid, all chords that deviate
+        more than CHORD_MARGIN * tolerance at one of the CHORD_SAMPLES are split in halves afterwards.
+        The cusps (see cusp_angles) are points of the sampling, so no chord cuts a corner.
+        '''
+        tooth = 2 * math.pi / self.ring
+        n = int(round(self.total_angle() / tooth)) * ADAPTIVE_GRID
+        grid = np.arange(n + 1) * (tooth / ADAPTIVE_GRID)
+        d1, d2 = self.derivatives(grid)
+        speed = np.hypot(d1[:, 0], d1[:, 1])
+        cross = np.abs(d1[:, 0] * d2[:, 1] - d1[:, 1] * d2[:, 0])
+        # speed * sqrt(curvature / (8 * tolerance)) with curvature = cross / speed**3
+        density = np.sqrt(cross / np.maximum(speed, 1e-12) / (8 * CHORD_MARGIN**2 * tolerance))
+        density = np.clip(density, 1 / (4 * tooth), 100 / tooth)
+        steps = np.concatenate(([0.0], np.cumsum((density[1:] + density[:-1]) / 2 * np.diff(grid))))
+        count = max(int(np.ceil(steps[-1])), 3)
+        angles = np.interp(np.linspace(0, steps[-1], count + 1)[:-1], steps, grid)
+        angles = np.union1d(angles, self.cusp_angles())
+        # the last chord ends at total_angle, where the path is closed or ends
+        a, b = angles, np.append(angles[1:], self.total_angle())
+        inserted = []
+        for _ in range(ADAPTIVE_DEPTH):
+            split = self.chord_deviation(a, b) > CHORD_MARGIN * tolerance
+            if not split.any():
+                break
+            a, b = a[split], b[split]
+            middle = (a + b) / 2
+            inserted.append(middle)
+            a, b = np.concatenate((a, middle)), np.concatenate((middle, b))
+        if inserted:
+            angles = np.sort(np.concatenate([angles] + inserted))
+        return angles
+
+    def cusp_angles(self):
+        '''returns the angles in [0, total_angle) where the pen touches the ring, i.e. beta = alpha
+
+        With an excenter of 1.0 the spirograph has a cusp there, otherwise a point of strong curvature.
+        '''
+        step = 2 * math.pi * abs(self.wheel) / self.ring
+        first = (self.offset * self.wheel / self.ring) % step
+        return np.arange(first, self.total_angle(), step)
+
+    def chord_deviation(self, a, b):
+        '''returns the largest distance of the curve at CHORD_SAMPLES from the chords between the angles a and b'''
+        p, q = self.pen_positions(a), self.pen_positions(b)
+        d = q - p
+        dd = np.maximum(np.einsum('ij,ij->i', d, d), 1e-300)
+        result = np.zeros(len(a))
+        for t in CHORD_SAMPLES:
+            w = self.pen_positions(a + t * (b - a)) - p
+            u = np.clip(np.einsum('ij,ij->i', w, d) / dd, 0, 1)
+            result = np.maximum(result, np.hypot(*(w - u[:, np.newaxis] * d).T))
+        return result
+
+    def total_angle(self):
+        '''returns the angle the wheel runs until the spirograph is closed or max_revolutions are reached'''
+        return self.step_count() // self.samples * 2 * math.pi / self.ring
+
+    def bezier_ctrl_points(self, angles):
+        '''returns the start, control and end points of the cubic Bézier segments between angles
+
+        The control points follow from the analytic derivative of the pen position (Hermite form).
+        '''
+        p = self.pen_positions(angles)
+        d, _ = self.derivatives(angles)
+        h = np.diff(angles)[:, np.newaxis] / 3
+        return p[:-1], p[:-1] + h * d[:-1], p[1:] - h * d[1:], p[1:]
+
+    def bezier_angles(self, tolerance):
+        '''returns the angles of the end points of Bézier segments that deviate less than tolerance from the curve
+
+        Starting with segments of about 24 teeth, all segments that deviate
+        more than tolerance at t = 1/4, 1/2 or 3/4 are split in halves.
+        '''
+        total = self.total_angle()
+        angles = np.linspace(0, total, max(int(np.ceil(self.ring * total / (48 * math.pi))), 8) + 1)
+        for _ in range(BEZIER_DEPTH):
+            p0, p1, p2, p3 = self.bezier_ctrl_points(angles)
+            error = np.zeros(len(p0))
+            for t in (0.25, 0.5, 0.75):
+                u = 1 - t
+                b = u**3 * p0 + 3 * u * u * t * p1 + 3 * u * t * t * p2 + t**3 * p3
+                q = self.pen_positions(angles[:-1] + t * np.diff(angles))
+                error = np.maximum(error, np.hypot(*(b - q).T))
+            split = error > tolerance
+            if not split.any():
+                break
+            middle = (angles[:-1][split] + angles[1:][split]) / 2
+            angles = np.sort(np.concatenate((angles, middle)))
+        return angles
+
+    def array(self, key=slice(None)):
+        '''returns the points of an index or slice as (N, 2) array in one vectorized pass'''
+        if isinstance(key, int):
+            if key < 0: # Handle negative indices
+                key += len(self)
+            if key < 0 or key >= len(self):
+                raise IndexError(f'Spirograph index {key} is out of range.')
+            key = slice(key, key + 1)
+        if not isinstance(key, slice):
+            raise TypeError(f'Spirograph indices must be integers or slices, not {key.__class__.__name__}')
+        return self.pen_positions(np.arange(*key.indices(len(self))) * self.step_size())
+
     def __getitem__(self, key):
         if isinstance(key, slice):
-            return [self[i] for i in range(*key.indices(len(self)))]
+            return list(map(tuple, self.array(key).tolist()))
         if isinstance(key, int):
             if key < 0: # Handle negative indices
                 key += len(self)
@@ -93,19 +268,74 @@ class Spirograph:
     def points(self):
         return self[:]
 
+    def chunks(self, chunk_size=CHUNK_SIZE):
+        '''yields the points of the path as (N, 2) arrays of at most chunk_size points
+
+        If a tolerance is set the points of the adaptive sampling are used.
+        '''
+        if self.tolerance is not None:
+            angles = self.adaptive_angles(self.tolerance)
+            for start in range(0, len(angles), chunk_size):
+                yield self.pen_positions(angles[start:start + chunk_size])
+            return
+        for start in range(0, len(self), chunk_size):
+            yield self.array(slice(start, start + chunk_size))
+
+    def svg_path_chunks(self, chunk_size=CHUNK_SIZE):
+        '''yields the SVG path data piece by piece, one piece per chunk of points'''
+        if self.curves:
+            yield from self.svg_curve_chunks(chunk_size)
+            return
+        for i, points in enumerate(self.chunks(chunk_size)):
+            if i == 0:
+                yield 'M ' + svg.fmt_array(points[0])
+                points = points[1:]
+            if len(points):
+                values = svg.fmt_values(points)
+                yield ' L ' + ' L '.join(map(' '.join, zip(values[::2], values[1::2])))
+        if self.closed():
+            yield ' Z'
+        else:
+            yield ' L ' + svg.fmt_array(self.pen_positions(self.total_angle()))
+
+    def svg_curve_chunks(self, chunk_size=CHUNK_SIZE):
+        '''yields the SVG path data of cubic Bézier segments piece by piece'''
+        angles = self.bezier_angles(self.tolerance or DEFAULT_TOLERANCE)
+        yield 'M ' + svg.fmt_array(self.pen_positions(angles[0]))
+        for start in range(0, len(angles) - 1, chunk_size):
+            _, p1, p2, p3 = self.bezier_ctrl_points(angles[start:start + chunk_size + 1])
+            values = iter(svg.fmt_values(np.hstack((p1, p2, p3))))
+            yield ' C ' + ' C '.join(map(' '.join, zip(*[values] * 6)))
+        if self.closed():
+            yield ' Z'
+
+    def svg_path_data(self, chunk_size=CHUNK_SIZE):
+        '''returns the SVG path data that is generated while it is written'''
+        return svg.PathData(lambda: self.svg_path_chunks(chunk_size))
+
     def svg_path(self):
-        return svg.PathCreator(self[0]).line_to(*self[1:]).close().path
+        return ''.join(self.svg_path_chunks())
 
     class Iterator:
         def __init__(self, spiro):
-            self.index = -1
+            self.index = 0
             self.spiro = spiro
-    
+            self.buffer = iter(())
+
         def __next__(self):
-            self.index += 1
-            if self.index == len(self.spiro):
+            try:
+                return next(self.buffer)
+            except StopIteration:
+                pass
+            if self.index >= len(self.spiro):
                 raise StopIteration()
-            return self.spiro[self.index]
+            stop = self.index + CHUNK_SIZE
+            self.buffer = map(tuple, self.spiro.array(slice(self.index, stop)).tolist())
+            self.index = stop
+            return next(self.buffer)
+
+        def __iter__(self):
+            return self
 
     def __iter__(self):
         return self.Iterator(self)
@@ -19,6 +19,15 @@ Each spirograph is described as a JSON object with its parameters:
 +----------+-------+--------------------------------------------------------+
 | samples  | int   | number of points calculated for each teeth of the ring |
 +----------+-------+--------------------------------------------------------+
+| tolerance| float | max. deviation of the path from the curve in mm,       |
+|          |       | enables adaptive sampling and replaces samples         |
++----------+-------+--------------------------------------------------------+
+| curves   | bool  | draw cubic Bézier curves instead of lines              |
+|          |       | (tolerance defaults to 0.01)                           |
++----------+-------+--------------------------------------------------------+
+| max_revo-| int   | max. number of revolutions of the wheel, the           |
+| lutions  |       | spirograph stays open if it needs more                 |
++----------+-------+--------------------------------------------------------+
 
 By default the wheel runs inside the ring.
 If the teeth count or the wheel is negative it will run outside of the ring.
@@ -44,21 +53,71 @@ Example for a spriograph object with additional SVG attributes:
 
     {"ring": 104, "wheel": 52, "fill": "blue", "stroke": "red", "stroke-width": "0.2"}
 
-The spirograph compiler accepts a file name for the input file.
+Files with the extension ``.ndjson`` (or all input with option ``--ndjson``)
+contain one spirograph object per line (newline delimited JSON).
+They are read and rendered one spirograph at a time while the SVG file is written,
+so even files with many thousands of spirographs are never in memory at once.
+Because the size of the image is written first, it is taken from a header record
+in the first line or from the option ``--r-max``, which takes precedence.
+Errors are reported with their line number, and an output file is only replaced if all lines were compiled:
+
+    {"r_max": 60}
+    {"ring": 104, "wheel": 52, "excenter": 0.6}
+    {"ring": 104, "wheel": 48, "stroke": "red"}
+
+``r_max`` is the largest radius of the spirographs in mm, parts outside of it are clipped.
+NDJSON files are not stored in the render cache.
+
+The spirograph compiler accepts file names and directories for the input files.
+A directory stands for all ``.spiro`` files inside of it.
 If no file name is provided, it will read from ``sys.stdin``.
 
-It generates a file named after the input file
-but replaces the extension ``.spiro`` by ``.svg``.
+For each input file it generates a file named after the input file
+but replaces the extension ``.spiro`` or ``.ndjson`` by ``.svg``, or by ``.svgz``
+for compressed output (see option ``--svgz``).
 If no input file is specified it will write to ``sys.stdout``
+
+The paths of the spirographs are computed in parallel by worker processes (see option ``--jobs``).
+Only the next spirographs of all input files are computed ahead of the output,
+each path is released as soon as it is written, so the memory does not grow with the number of spirographs.
+With ``--jobs 1`` the paths are computed in the main process while they are written.
+The option ``--profile`` does not cover the worker processes, use ``--jobs 1`` to profile the path generation.
+The results are assembled in the original order, so the output does not depend on the number of workers.
+An input file that fails is reported and the compiler continues with the next file.
+
+Output files which were compiled before from the same spirographs with the same options
+are copied from the render cache without computing any path (see options ``--cache-dir`` and ``--no-cache``).
+The output to ``sys.stdout`` is not cached.
+
+With the option ``--watch`` the compiler keeps running and polls the input files and directories
+(see option ``--interval``). A new or modified file is compiled again,
+but only the spirographs with changed parameters are computed,
+the path data of the others is taken from an in-memory cache.
+It keeps the paths of all spirographs of the watched files however many there are,
+and the last paths which were removed from the files (see option ``--path-cache``).
+Stop the compiler with Ctrl+C.
 '''
 
 import os
 import sys
 import json
+import time
+import signal
 import argparse
+import itertools
+import contextlib
+from collections import deque
+from concurrent.futures import ProcessPoolExecutor
 import techdraw as svg
+from techdraw import profiling, cache as render_cache
+from techdraw.cache import LRUCache
 from . import Spirograph
 
+PATH_CACHE_SIZE = 256 # number of path data strings of removed spirographs kept in watch mode
+WATCH_INTERVAL = 1.0 # seconds
+NDJSON_EXTENSION = '.ndjson'
+STREAM_LOOKAHEAD = 64 # number of spirographs that are computed ahead of the output
+
 def get_value(data: dict, key: str, default=None):
     '''Reads a value from dict'''
     if key in data.keys():
@@ -77,39 +136,358 @@ def parse_hook(data: dict):
     excenter = get_value(data, 'excenter', 0.8)
     offset = get_value(data, 'offset', 0)
     samples = get_value(data, 'samples', 1)
-    return Spirograph(ring, wheel, excenter, offset, samples), data
+    tolerance = data.pop('tolerance', None)
+    curves = data.pop('curves', False)
+    max_revolutions = data.pop('max_revolutions', None)
+    return Spirograph(ring, wheel, excenter, offset, samples, tolerance, curves, max_revolutions), data
 
-if __name__ == "__main__":
-    PROG = 'spirograph.compile'
-    DESCRIPTION = 'Command line tool to generate SVG files form spirograph files.'
-    parser = argparse.ArgumentParser(prog=PROG, description=DESCRIPTION)
-    parser.add_argument('filename', nargs='?', type=str, help='name of input file', default=sys.stdin)
-    args = parser.parse_args()
+def load(file):
+    '''Reads the list of tuples (Spirograph, attrib) from a spirograph file'''
+    data = json.load(file, object_hook=parse_hook)
+    if isinstance(data, tuple):
+        data = [data]
+    return data
 
-    try:
-        if args.filename is sys.stdin:
-            outfile = sys.stdout
-            data = json.load(sys.stdin, object_hook=parse_hook)
-            args.filename = 'stdin'
+def load_ndjson(file):
+    '''Reads an NDJSON spirograph file lazily
+
+    Returns r_max of the header record or None and an iterator of tuples (Spirograph, attrib).
+    '''
+    lines = ((number, line) for number, line in enumerate(file, 1) if line.strip())
+    r_max = None
+    first = next(lines, None)
+    if first is not None:
+        number, line = first
+        try:
+            record = json.loads(line)
+            if isinstance(record, dict) and 'r_max' in record and 'ring' not in record:
+                r_max = float(record['r_max'])
+            else:
+                lines = itertools.chain([first], lines)
+        except (ValueError, TypeError) as error:
+            raise ValueError(f'line {number}: {error}') from error
+
+    def records():
+        for number, line in lines:
+            try:
+                yield parse_hook(json.loads(line))
+            except Exception as error:
+                raise ValueError(f'line {number}: {error}') from error
+    return r_max, records()
+
+def is_ndjson(filename):
+    return filename.endswith(NDJSON_EXTENSION)
+
+def input_files(names):
+    '''Expands directories to the spirograph files inside of them'''
+    for name in names:
+        if os.path.isdir(name):
+            for entry in sorted(os.listdir(name)):
+                if entry.endswith('.spiro'):
+                    yield os.path.join(name, entry)
         else:
-            with open(args.filename) as f:
-                data = json.load(f, object_hook=parse_hook)
-            base, ext = os.path.splitext(args.filename)
-            outfile = base + '.svg' if ext == '.spiro' else args.filename + '.svg'
-    except Exception as error:
-        print(PROG + ':', error, file=sys.stderr)
-        sys.exit(-1)
-    
+            yield name
+
+def output_file(filename, extension='.svg'):
+    '''returns the name of the SVG file for a spirograph file'''
+    base, ext = os.path.splitext(filename)
+    return base + extension if ext in ('.spiro', NDJSON_EXTENSION) else filename + extension
+
+def svg_path(spirograph):
+    '''returns the path data of a spirograph, used by the worker processes'''
+    return spirograph.svg_path()
+
+def cache_key(filename, outfile, data, output_format=None, compresslevel=svg.COMPRESSLEVEL_DEFAULT):
+    '''returns the key of the output file in the render cache'''
+    return render_cache.RenderCache.key('spirograph.compile', filename, [[spirograph.params(), attrib] for spirograph, attrib in data],
+        render_cache.output_params(outfile, output_format, compresslevel))
+
+def stream_paths(data, pool=None, lookahead=STREAM_LOOKAHEAD, errors=False):
+    '''yields the tuples (Spirograph, attrib, path data) of an iterable of tuples (Spirograph, attrib) in their order
+
+    With a pool the paths of the next lookahead spirographs are computed in parallel.
+    With errors the exception of a failed path is yielded in place of its path data,
+    so the stream continues with the next spirograph, see raise_errors.
+    '''
+    if pool is None:
+        for spirograph, attrib in data:
+            yield spirograph, attrib, spirograph.svg_path_data()
+        return
+
+    def result(future):
+        try:
+            return future.result()
+        except Exception as error:
+            if not errors:
+                raise
+            return error
+
+    pending = deque()
+    for spirograph, attrib in data:
+        pending.append((spirograph, attrib, pool.submit(svg_path, spirograph)))
+        if len(pending) > lookahead:
+            spirograph, attrib, future = pending.popleft()
+            yield spirograph, attrib, result(future)
+    while pending:
+        spirograph, attrib, future = pending.popleft()
+        yield spirograph, attrib, result(future)
+
+def raise_errors(paths):
+    '''yields the tuples of stream_paths with errors and raises the first exception yielded'''
+    for spirograph, attrib, d in paths:
+        if isinstance(d, Exception):
+            raise d
+        yield spirograph, attrib, d
+
+def file_state(filename):
+    '''returns modification time and size of a file or None if it does not exist'''
+    try:
+        stat = os.stat(filename)
+    except OSError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+class PathCache:
+    '''Path data of the spirographs of the watched files
+
+    The paths are kept as long as a file contains their spirograph,
+    so the files are never evicted from the cache whatever number of spirographs they have.
+    The paths of spirographs which are removed from all files are moved
+    to an LRUCache of size entries, e.g. to be reused if the change is undone.
+    '''
+
+    def __init__(self, size=PATH_CACHE_SIZE):
+        self.entries = {} # key -> [path data, number of files with the spirograph]
+        self.files = {}   # file name -> keys of its spirographs
+        self.removed = LRUCache(size)
+        self.misses = 0
+
+    def paths(self, filename, data, pool=None):
+        '''returns the path data of the spirographs of a file, only the unknown ones are computed'''
+        keys = [json.dumps(spirograph.params(), sort_keys=True) for spirograph, _ in data]
+        paths = {}
+        futures = {}
+        for key, (spirograph, _) in zip(keys, data):
+            if key in paths or key in futures:
+                continue
+            if key in self.entries:
+                paths[key] = self.entries[key][0]
+            elif key in self.removed:
+                paths[key] = self.removed.get(key, None)
+            elif pool is not None:
+                futures[key] = pool.submit(svg_path, spirograph)
+            else:
+                paths[key] = spirograph.svg_path()
+                self.misses += 1
+        self.misses += len(futures)
+        for key, future in futures.items():
+            paths[key] = future.result()
+        self.update(filename, paths)
+        return [paths[key] for key in keys]
+
+    def update(self, filename, paths):
+        '''replaces the spirographs of a file by the dict paths of their keys and path data'''
+        for key, d in paths.items():
+            self.entries.setdefault(key, [d, 0])[1] += 1
+        self.remove(filename)
+        self.files[filename] = list(paths)
+
+    def remove(self, filename):
+        '''forgets the spirographs of a file, e.g. when it is deleted'''
+        for key in self.files.pop(filename, ()):
+            entry = self.entries[key]
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self.entries[key]
+                self.removed.put(key, entry[0])
+
+    def __len__(self):
+        return len(self.entries)
+
+def watch_worker():
+    '''Initializes a worker process of the watch mode, Ctrl+C only stops the main process'''
+    profiling.disable()
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+def watch(names, compile_file, interval=WATCH_INTERVAL, remove_file=None):
+    '''Polls the input files and calls compile_file(filename) for each new or modified file, runs until it is interrupted
+
+    remove_file(filename) is called for each file which disappeared.
+    '''
+    states = {}
+    while True:
+        found = set()
+        for filename in input_files(names):
+            state = file_state(filename)
+            if state is None:
+                continue
+            found.add(filename)
+            if states.get(filename) != state:
+                states[filename] = state
+                compile_file(filename)
+        for filename in set(states) - found:
+            del states[filename]
+            if remove_file is not None:
+                remove_file(filename)
+        time.sleep(interval)
+
+def max_radius(data):
+    '''returns the largest r_max of a list of tuples (Spirograph, attrib)'''
     r_max = 0
     for spirograph, _ in data:
         if spirograph.r_max() > r_max:
             r_max = spirograph.r_max()
+    return r_max
+
+def image(filename, data, paths, output_format=None):
+    '''Creates the SVG image of the spirographs of a file with the given path data'''
+    r_max = int(max_radius(data) + 2)
+    width = 2 * r_max
+    img = svg.Image((width, width), (r_max, r_max), output_format=output_format)
+    img.desc.text = f'Spirograph from file: {filename}'
+    for (_, attrib), d in zip(data, paths):
+        svg.Path(img.content, d, { 'stroke-width': '0.5', 'stroke': 'black', 'fill': 'none', **attrib })
+    return img
+
+def stream_image(filename, paths, r_max, output_format=None):
+    '''Creates the SVG image of an iterable of tuples (Spirograph, attrib, path data), see stream_paths
 
+    The spirographs are read and their paths are computed while the image is written.
+    r_max is the largest radius of the spirographs and determines the size of the image.
+    '''
     r_max = int(r_max + 2)
     width = 2 * r_max
-    img = svg.Image((width, width), (r_max, r_max))
-    img.desc.text = f'Spirograph from file: {args.filename}'
-    for spirograph, attrib in data:
-        svg.Path(img.content, spirograph.svg_path(), { 'stroke-width': '0.5', 'stroke': 'black', 'fill': 'none', **attrib })
-    
-    img.write(outfile)
+    img = svg.Image((width, width), (r_max, r_max), output_format=output_format)
+    img.desc.text = f'Spirograph from file: {filename}'
+
+    def elements(stream):
+        for spirograph, attrib, d in paths:
+            if spirograph.r_max() > r_max:
+                print(f'spirograph.compile: {filename}: spirograph with r_max = {spirograph.r_max():g} exceeds the image and is clipped', file=sys.stderr)
+            yield svg.Path(stream, d, { 'stroke-width': '0.5', 'stroke': 'black', 'fill': 'none', **attrib })
+    img.content.append(svg.ElementStream(elements))
+    return img
+
+if __name__ == "__main__":
+    PROG = 'spirograph.compile'
+    DESCRIPTION = 'Command line tool to generate SVG files form spirograph files.'
+    parser = argparse.ArgumentParser(prog=PROG, description=DESCRIPTION)
+    parser.add_argument('filenames', nargs='*', type=str, help='names of input files or directories')
+    parser.add_argument('-j', '--jobs', type=int, help='number of worker processes, 1 computes the paths in the main process (default: number of CPUs)', default=None)
+    parser.add_argument('--compact', action='store_true', help='write relative path commands without redundant whitespace and zeros')
+    parser.add_argument('--precision', type=svg.OutputFormat.precision_option, help='number of decimals of coordinates', default=None)
+    parser.add_argument('-z', '--svgz', action='store_true', help='write compressed .svgz files')
+    parser.add_argument('--compresslevel', type=int, choices=range(10), metavar='0..9', help='gzip compression level of .svgz files', default=svg.COMPRESSLEVEL_DEFAULT)
+    parser.add_argument('--ndjson', action='store_true', help=f'read all input as NDJSON, not only files with the extension {NDJSON_EXTENSION}')
+    parser.add_argument('--r-max', type=float, metavar='MM', help='largest radius of the spirographs of NDJSON input, replaces the header record', default=None)
+    parser.add_argument('--watch', action='store_true', help='keep running and compile the input files again when they are modified')
+    parser.add_argument('--interval', type=float, metavar='SECONDS', help=f'polling interval of --watch (default: {WATCH_INTERVAL})', default=WATCH_INTERVAL)
+    parser.add_argument('--path-cache', type=int, metavar='N', help=f'number of paths of removed spirographs kept by --watch (default: {PATH_CACHE_SIZE})', default=PATH_CACHE_SIZE)
+    render_cache.add_arguments(parser)
+    parser.add_argument('--profile', nargs='?', const='-', metavar='FILE', help='write stage timings as JSON to FILE or stderr')
+    args = parser.parse_args()
+    profiling.start(args.profile)
+
+    output_format = svg.OutputFormat.create(args.compact, args.precision)
+    extension = '.svgz' if args.svgz else '.svg'
+    cache = render_cache.from_arguments(args)
+
+    def write(img, outfile, key):
+        img.write(outfile, compresslevel=args.compresslevel)
+        if key is not None:
+            cache.store(key, outfile)
+        profiling.output_file(outfile)
+
+    def compile_ndjson(filename, file, outfile, pool=None):
+        r_max, data = load_ndjson(file)
+        if args.r_max is not None:
+            r_max = args.r_max
+        if r_max is None:
+            raise ValueError('size of the image unknown, add a header record {"r_max": ...} or use the option --r-max')
+        write(stream_image(filename, stream_paths(data, pool), r_max, output_format), outfile, None)
+
+    if args.watch:
+        if not args.filenames:
+            print(f'{PROG}: --watch needs input files or directories', file=sys.stderr)
+            sys.exit(-1)
+        paths = PathCache(args.path_cache)
+
+        def compile_file(filename):
+            outfile = output_file(filename, extension)
+            try:
+                if args.ndjson or is_ndjson(filename):
+                    with open(filename) as f:
+                        compile_ndjson(filename, f, outfile, pool)
+                    print(f'{PROG}: {outfile}: compiled', file=sys.stderr)
+                    return
+                with open(filename) as f:
+                    data = load(f)
+                key = cache_key(filename, outfile, data, output_format, args.compresslevel) if cache is not None else None
+                misses = paths.misses
+                if key is not None and cache.fetch(key, outfile):
+                    profiling.output_file(outfile)
+                else:
+                    write(image(filename, data, paths.paths(filename, data, pool), output_format), outfile, key)
+                print(f'{PROG}: {outfile}: {paths.misses - misses} of {len(data)} spirographs computed', file=sys.stderr)
+            except Exception as error:
+                print(f'{PROG}: {filename}: {error}', file=sys.stderr)
+
+        with contextlib.nullcontext() if args.jobs == 1 else ProcessPoolExecutor(max_workers=args.jobs, initializer=watch_worker) as pool:
+            try:
+                watch(args.filenames, compile_file, args.interval, paths.remove)
+            except KeyboardInterrupt:
+                pass
+        sys.exit(0)
+
+    documents = []
+    streams = [] # NDJSON input: (filename, file name or file, outfile)
+    failed = False
+    if not args.filenames and args.ndjson:
+        streams.append(('stdin', sys.stdin, sys.stdout))
+    elif not args.filenames:
+        try:
+            documents.append(('stdin', sys.stdout, load(sys.stdin)))
+        except Exception as error:
+            print(PROG + ':', error, file=sys.stderr)
+            sys.exit(-1)
+    for filename in input_files(args.filenames):
+        if args.ndjson or is_ndjson(filename):
+            streams.append((filename, filename, output_file(filename, extension)))
+            continue
+        try:
+            with open(filename) as f:
+                documents.append((filename, output_file(filename, extension), load(f)))
+        except Exception as error:
+            print(f'{PROG}: {filename}: {error}', file=sys.stderr)
+            failed = True
+
+    pending = []
+    for filename, outfile, data in documents:
+        key = cache_key(filename, outfile, data, output_format, args.compresslevel) if cache is not None and isinstance(outfile, str) else None
+        if key is not None and cache.fetch(key, outfile):
+            profiling.output_file(outfile)
+        else:
+            pending.append((filename, outfile, data, key))
+
+    with contextlib.nullcontext() if args.jobs == 1 else ProcessPoolExecutor(max_workers=args.jobs, initializer=profiling.disable) as pool:
+        # one stream over all files keeps the workers busy at the end of a file
+        paths = stream_paths((item for _, _, data, _ in pending for item in data), pool, errors=True)
+        for filename, outfile, data, key in pending:
+            items = itertools.islice(paths, len(data))
+            try:
+                write(stream_image(filename, raise_errors(items), max_radius(data), output_format), outfile, key)
+            except Exception as error:
+                print(f'{PROG}: {filename}: {error}', file=sys.stderr)
+                failed = True
+                # the next file starts with the paths after the ones of this file
+                deque(items, maxlen=0)
+        for filename, source, outfile in streams:
+            try:
+                with open(source) if isinstance(source, str) else contextlib.nullcontext(source) as f:
+                    compile_ndjson(filename, f, outfile, pool)
+            except Exception as error:
+                print(f'{PROG}: {filename}: {error}', file=sys.stderr)
+                failed = True
+
+    if failed:
+        sys.exit(-1)
@@ -11,6 +11,7 @@ for details about the parameters.
 
 import argparse
 import techdraw as svg
+from techdraw import profiling, cache as render_cache
 import sys
 from . import Spirograph
 
@@ -19,13 +20,22 @@ if __name__ == "__main__":
     DESCRIPTION = 'Generate spirographs SVG files.'
     parser = argparse.ArgumentParser(prog=PROG, description=DESCRIPTION)
     #parser = argparse.ArgumentParser(description=DESCRIPTION)
-    parser.add_argument('filename', type=str, help='name of output SVG file', nargs='?', default=sys.stdout)
+    parser.add_argument('filename', type=str, help='name of output SVG file, the extension .svgz writes a compressed file', nargs='?', default=sys.stdout)
     parser.add_argument('-r', '--ring', type=int, help='number of teeth of the ring', default=105)
     parser.add_argument('-w', '--wheel', type=int, help='number of teeth of the wheel', default=50)
     parser.add_argument('-e', '--excenter', type=float, help='excenter value of the pen', default=0.8)
     parser.add_argument('-o', '--offset', type=int, help='offset of the wheel at its start position', default=0)
     parser.add_argument('-s', '--samples', type=int, help='samples per tooth step', default=1)
+    parser.add_argument('-t', '--tolerance', type=float, help='max. deviation of the path from the curve in mm, enables adaptive sampling', default=None)
+    parser.add_argument('-c', '--curves', action='store_true', help='draw cubic Bézier curves instead of lines')
+    parser.add_argument('--max-revolutions', type=int, metavar='N', help='draw at most N revolutions of the wheel, the spirograph stays open if it needs more', default=None)
+    parser.add_argument('--compact', action='store_true', help='write relative path commands without redundant whitespace and zeros')
+    parser.add_argument('--precision', type=svg.OutputFormat.precision_option, help='number of decimals of coordinates', default=None)
+    parser.add_argument('--compresslevel', type=int, choices=range(10), metavar='0..9', help='gzip compression level of .svgz files', default=svg.COMPRESSLEVEL_DEFAULT)
+    render_cache.add_arguments(parser)
+    parser.add_argument('--profile', nargs='?', const='-', metavar='FILE', help='write stage timings as JSON to FILE or stderr')
     args = parser.parse_args()
+    profiling.start(args.profile)
 
     args.ring = abs(args.ring)
     args.excenter = abs(args.excenter)
@@ -46,12 +56,31 @@ if __name__ == "__main__":
         print(f'{PROG}: Number of samples must be > 0 but is {args.samples}. Value set to 1.', file=sys.stderr)
         args.samples = 1
 
-    spirograph = Spirograph(args.ring, args.wheel, args.excenter, args.offset, args.samples)
+    if args.tolerance is not None and args.tolerance <= 0.0:
+        print(f'{PROG}: Tolerance must be > 0 but is {args.tolerance}. Adaptive sampling disabled.', file=sys.stderr)
+        args.tolerance = None
 
-    M = (0, 0)
-    c = int(spirograph.r_max() + 2)
-    w = c * 2
-    img = svg.Image((w, w), (c, c))
-    img.desc.text = f'Spirograph: ring = {args.ring}, wheel = {args.wheel}, excenter = {args.excenter}, offset = {args.offset}, samples = {args.samples}'
-    svg.Path(img.content, spirograph.svg_path(), { 'stroke-width': '0.5', 'stroke': 'black', 'fill': 'none'})
-    img.write(args.filename)
+    if args.max_revolutions is not None and args.max_revolutions < 1:
+        print(f'{PROG}: Max. revolutions must be > 0 but is {args.max_revolutions}. Limit disabled.', file=sys.stderr)
+        args.max_revolutions = None
+
+    spirograph = Spirograph(args.ring, args.wheel, args.excenter, args.offset, args.samples, args.tolerance, args.curves, args.max_revolutions)
+    if not spirograph.closed():
+        print(f'{PROG}: Revolutions limited to {spirograph.revolutions()} of {spirograph.full_revolutions()}, the spirograph is not closed.', file=sys.stderr)
+
+    def render(filename):
+        c = int(spirograph.r_max() + 2)
+        w = c * 2
+        img = svg.Image((w, w), (c, c), output_format=output_format)
+        img.desc.text = f'Spirograph: ring = {args.ring}, wheel = {args.wheel}, excenter = {args.excenter}, offset = {args.offset}, samples = {args.samples}'
+        svg.Path(img.content, spirograph.svg_path_data(), { 'stroke-width': '0.5', 'stroke': 'black', 'fill': 'none'})
+        img.write(filename, compresslevel=args.compresslevel)
+
+    output_format = svg.OutputFormat.create(args.compact, args.precision)
+    if isinstance(args.filename, str):
+        key = render_cache.RenderCache.key('spirograph.gen', spirograph.params(), args.offset,
+            render_cache.output_params(args.filename, output_format, args.compresslevel))
+        render_cache.render(render_cache.from_arguments(args), key, args.filename, render)
+    else:
+        render(args.filename) # standard output is not cached
+    profiling.output_file(args.filename)
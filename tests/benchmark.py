@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+'''Benchmarks of the geometry and serialization hot paths
+
+Each case is run a few times, the best wall time is reported.
+The peak memory is measured in an extra run with tracemalloc.
+
+Use (the sources in src are imported, the package need not be installed):
+    python tests/benchmark.py --save baseline.json
+    python tests/benchmark.py --compare baseline.json
+
+With --compare the results are compared to a stored baseline and
+the script exits with 1 if a case got slower or needs more memory than
+the baseline times the threshold.
+'''
+
+import os
+import sys
+import json
+import time
+import argparse
+import tracemalloc
+import numpy as np
+
+# runs from a checkout without installing the package
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src'))
+
+import techdraw as svg
+import techdraw.gearwheel as gearwheel
+from techdraw.spirograph import Spirograph
+from techdraw import involute, raster
+
+class NullFile:
+    '''Text file that only counts the characters written'''
+
+    def __init__(self):
+        self.size = 0
+
+    def write(self, text):
+        self.size += len(text)
+
+def path_creator_line_to(n):
+    points = np.random.default_rng(0).uniform(-50, 50, (n, 2)).tolist()
+    return svg.PathCreator((0, 0)).line_to(*points).path
+
+def path_creator_curve_to(n):
+    p = svg.PathCreator((0, 0), 0)
+    for i in range(n):
+        p.curve_to(svg.pol2cart(10 + i % 7, i * 0.3), i * 0.3 + 1.2)
+    return p.path
+
+def path_creator_curves_to(n):
+    i = np.arange(n)
+    return svg.PathCreator((0, 0), 0).curves_to(svg.pol2cart(10 + i % 7, i * 0.3).T, i * 0.3 + 1.2).path
+
+def path_creator_arc_to_line(n):
+    p = svg.PathCreator((0, 0), 0)
+    for i in range(n):
+        p.arc_to_line(svg.pol2cart(10 + i % 5, i * 0.7), i * 0.7 + 2.0)
+    return p.path
+
+def gearwheel_svg_path(n_teeth):
+    gearwheel.cache.clear()
+    return gearwheel.GearWheel(2, n_teeth).svg_path()
+
+def spirograph_svg_path(ring, wheel, samples):
+    return Spirograph(ring, wheel, samples=samples).svg_path()
+
+def involute_points(n):
+    return involute.points(20, np.radians(-180), 0, n)
+
+def image_build(n):
+    img = svg.Image((200, 200), (100, 100))
+    rng = np.random.default_rng(0)
+    for p, q in rng.uniform(-100, 100, (n, 2, 2)):
+        svg.Line(img.content, p, q)
+        svg.Dot(img.content, p)
+    svg.Path(img.content, Spirograph(105, 84, samples=4).svg_path_data())
+    return img
+
+IMAGES = {}
+
+def image_write(n):
+    if n not in IMAGES:
+        IMAGES[n] = image_build(n)
+    f = NullFile()
+    IMAGES[n].write(f)
+    return f.size
+
+GEARWHEEL_IMAGE = gearwheel.GearWheel(2, 30).svg_image()
+
+def raster_gearwheel(size):
+    return raster.png_bytes(raster.rasterize(GEARWHEEL_IMAGE, size))
+
+CASES = {
+    'path_creator.line_to[10000]': lambda: path_creator_line_to(10000),
+    'path_creator.curve_to[2000]': lambda: path_creator_curve_to(2000),
+    'path_creator.curves_to[2000]': lambda: path_creator_curves_to(2000),
+    'path_creator.arc_to_line[1000]': lambda: path_creator_arc_to_line(1000),
+    'involute.points[100000]': lambda: involute_points(100000),
+    'image.build[20000]': lambda: image_build(20000),
+    'image.write[20000]': lambda: image_write(20000),
+    'raster.gearwheel[128]': lambda: raster_gearwheel(128),
+    'raster.gearwheel[512]': lambda: raster_gearwheel(512),
+}
+for teeth in (20, 100, 250):
+    CASES[f'gearwheel.svg_path[{teeth}]'] = lambda teeth=teeth: gearwheel_svg_path(teeth)
+for ring, wheel, samples in ((105, 84, 1), (105, 84, 10), (997, 96, 2), (150, -71, 1)):
+    CASES[f'spirograph.svg_path[{ring},{wheel},{samples}]'] = lambda r=ring, w=wheel, s=samples: spirograph_svg_path(r, w, s)
+
+def measure(case, repeat):
+    '''returns the best wall time in seconds and the peak memory in bytes of a case'''
+    times = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        case()
+        times.append(time.perf_counter() - start)
+    tracemalloc.start()
+    case()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return min(times), peak
+
+def compare(results, baseline, threshold):
+    '''prints the comparison with the baseline and returns the names of the regressed cases'''
+    regressions = []
+    for name, result in results.items():
+        if name not in baseline:
+            continue
+        t = result['time'] / baseline[name]['time']
+        m = result['peak'] / max(baseline[name]['peak'], 1)
+        flag = ''
+        if t > threshold or m > threshold:
+            flag = '  REGRESSION'
+            regressions.append(name)
+        print(f'{name:40} time x{t:5.2f}  peak x{m:5.2f}{flag}')
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(prog='python tests/benchmark.py', description='Runs the techdraw benchmarks.')
+    parser.add_argument('-k', '--filter', type=str, help='run only cases containing this text', default='')
+    parser.add_argument('-r', '--repeat', type=int, help='number of timed runs per case', default=3)
+    parser.add_argument('--save', type=str, help='store the results as baseline in this JSON file')
+    parser.add_argument('--compare', type=str, help='compare the results to the baseline in this JSON file')
+    parser.add_argument('--threshold', type=float, help='max. ratio to the baseline (default: 1.25)', default=1.25)
+    args = parser.parse_args()
+
+    results = {}
+    for name, case in CASES.items():
+        if args.filter in name:
+            t, peak = measure(case, args.repeat)
+            results[name] = { 'time': t, 'peak': peak }
+            print(f'{name:40} {t * 1000:10.2f} ms {peak / 1024:10.1f} KiB')
+
+    if args.save:
+        with open(args.save, 'w') as f:
+            json.dump(results, f, indent=4)
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        print()
+        if compare(results, baseline, args.threshold):
+            sys.exit(1)
@@ -0,0 +1,90 @@
+import os
+import json
+import shutil
+import techdraw
+from techdraw import gearwheel
+from techdraw.cache import LRUCache, RenderCache, source_hash
+from techdraw.gearwheel import GearWheel
+
+def test_key_contains_source_hash():
+    key = json.loads(RenderCache.key('test', {'a': 1}))
+    assert key == [techdraw.__version__, source_hash(), 'test', {'a': 1}]
+
+def test_store_and_fetch(tmp_path):
+    cache = RenderCache(str(tmp_path / 'cache'))
+    source = tmp_path / 'a.svg'
+    source.write_text('<svg/>')
+    key = RenderCache.key('test')
+    assert not cache.fetch(key, str(tmp_path / 'b.svg'))
+    cache.store(key, str(source))
+    assert cache.fetch(key, str(tmp_path / 'b.svg'))
+    assert (tmp_path / 'b.svg').read_text() == '<svg/>'
+
+def test_fetch_evicted(tmp_path, monkeypatch):
+    cache = RenderCache(str(tmp_path / 'cache'))
+    source = tmp_path / 'a.svg'
+    source.write_text('<svg/>')
+    key = RenderCache.key('test')
+    cache.store(key, str(source))
+    copyfile = shutil.copyfile
+
+    def evicted(src, dst):
+        # another process evicts the file between utime and the copy
+        os.unlink(src)
+        return copyfile(src, dst)
+
+    monkeypatch.setattr(shutil, 'copyfile', evicted)
+    assert not cache.fetch(key, str(tmp_path / 'b.svg'))
+    assert not (tmp_path / 'b.svg').exists()
+
+def test_evict(tmp_path):
+    cache = RenderCache(str(tmp_path / 'cache'), max_size=250)
+    source = tmp_path / 'a.svg'
+    source.write_bytes(b'x' * 100)
+    for i in range(3):
+        cache.store(RenderCache.key(i), str(source))
+        os.utime(cache.filename(RenderCache.key(i)), (i, i))
+    cache.evict()
+    assert [os.path.exists(cache.filename(RenderCache.key(i))) for i in range(3)] == [False, True, True]
+
+def test_store_scans_rarely(tmp_path, monkeypatch):
+    cache = RenderCache(str(tmp_path / 'cache'), max_size=1000)
+    source = tmp_path / 'a.svg'
+    source.write_bytes(b'x' * 100)
+    scans = []
+    scandir = os.scandir
+    monkeypatch.setattr(os, 'scandir', lambda path: scans.append(path) or scandir(path))
+    for i in range(9):
+        cache.store(RenderCache.key(i), str(source))
+    cache.store(RenderCache.key(0), str(source)) # replaces a file
+    assert len(scans) == 1
+    cache.store(RenderCache.key(9), str(source))
+    cache.store(RenderCache.key(10), str(source))
+    assert len(scans) == 2
+    assert cache.size == sum(os.path.getsize(entry.path) for entry in scandir(cache.directory)) <= 1000
+
+def test_lru_cache_bytes():
+    cache = LRUCache(None, maxbytes=10)
+    cache.put('a', b'1234')
+    cache.put('b', b'1234')
+    cache.get('a', None)
+    cache.put('c', b'1234')
+    assert list(cache.entries) == ['a', 'c']
+    assert cache.bytes == 8
+    cache.put('a', b'1')
+    assert cache.bytes == 5
+    cache.put('d', b'x' * 11)
+    assert 'd' not in cache
+    assert cache.stats()['bytes'] == 5
+
+def test_gearwheel_cache_counters():
+    gearwheel.cache.clear()
+    GearWheel(2, 30).svg_image()
+    assert gearwheel.cache.stats()['misses'] == 2 and gearwheel.cache.stats()['hits'] == 0
+    gear_wheel = GearWheel(2, 30)
+    gear_wheel.svg_image()
+    assert gearwheel.cache.stats()['misses'] == 2 and gearwheel.cache.stats()['hits'] == 2
+    # a changed parameter is looked up again
+    gear_wheel.n_teeth = 31
+    assert gear_wheel.r_0() == 31
+    assert gearwheel.cache.stats()['misses'] == 3
@@ -0,0 +1,123 @@
+import io
+import os
+import sys
+import json
+import subprocess
+import pytest
+from techdraw.spirograph import Spirograph
+from techdraw.spirograph.compile import PathCache, load, load_ndjson, watch
+
+SRC = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'src')
+
+def spirographs(n, excenter=0.5):
+    return load(io.StringIO(json.dumps([{'ring': 96, 'wheel': 24 + i % 48, 'excenter': excenter, 'offset': i // 48}
+                                        for i in range(n)])))
+
+def test_path_cache_large_file():
+    cache = PathCache(size=4)
+    data = spirographs(300)
+    paths = cache.paths('a.spiro', data)
+    assert cache.misses == 300
+    assert paths == [spirograph.svg_path() for spirograph, _ in data]
+    assert cache.paths('a.spiro', data) == paths
+    assert cache.misses == 300
+
+def test_path_cache_change():
+    cache = PathCache(size=4)
+    data = spirographs(10)
+    cache.paths('a.spiro', data)
+    changed = data[:9] + [(Spirograph(96, 25, 0.7), {})]
+    cache.paths('a.spiro', changed)
+    assert cache.misses == 11
+    assert len(cache) == 10
+    # undo of the change
+    cache.paths('a.spiro', data)
+    assert cache.misses == 11
+
+def test_path_cache_files():
+    cache = PathCache(size=2)
+    data = spirographs(10)
+    cache.paths('a.spiro', data)
+    cache.paths('b.spiro', data[:5] + spirographs(5, 0.6))
+    assert cache.misses == 15
+    cache.remove('a.spiro')
+    assert len(cache) == 10
+    cache.remove('b.spiro')
+    assert len(cache) == 0
+    assert len(cache.removed.entries) == 2
+
+def test_watch_removed(tmp_path, monkeypatch):
+    a, b = tmp_path / 'a.spiro', tmp_path / 'b.spiro'
+    a.write_text('{"ring": 96, "wheel": 24}')
+    b.write_text('{"ring": 96, "wheel": 25}')
+    events = []
+
+    def sleep(interval):
+        if b.exists():
+            b.unlink()
+        else:
+            raise KeyboardInterrupt
+
+    monkeypatch.setattr('time.sleep', sleep)
+    try:
+        watch([str(tmp_path)], lambda name: events.append(('compile', name)), 0, lambda name: events.append(('remove', name)))
+    except KeyboardInterrupt:
+        pass
+    assert events == [('compile', str(a)), ('compile', str(b)), ('remove', str(b))]
+
+def test_load_ndjson():
+    r_max, records = load_ndjson(io.StringIO('{"r_max": 60}\n\n{"ring": 104, "wheel": 52}\n{"ring": 104, "wheel": 48, "stroke": "red"}\n'))
+    assert r_max == 60
+    assert [(spirograph.wheel, attrib) for spirograph, attrib in records] == [(52, {}), (48, {'stroke': 'red'})]
+
+@pytest.mark.parametrize('text, number', [
+    ('\n{"ring": 104, "wheel": \n', 2),
+    ('{"r_max": "large"}\n', 1),
+    ('{"r_max": 60}\n{"ring": 104, "wheel": 52}\n{"ring": 104}\n', 3),
+    ('{"ring": 104, "wheel": 52}\n[1, 2\n', 2),
+])
+def test_load_ndjson_errors(text, number):
+    with pytest.raises(ValueError, match=f'^line {number}: '):
+        _, records = load_ndjson(io.StringIO(text))
+        list(records)
+
+def compile_file(*args):
+    env = dict(os.environ, PYTHONPATH=SRC)
+    return subprocess.run([sys.executable, '-m', 'techdraw.spirograph.compile', '-j', '1', '--no-cache', *args],
+                          env=env, capture_output=True, text=True)
+
+def test_compile_ndjson_error(tmp_path):
+    source = tmp_path / 'a.ndjson'
+    source.write_text('{"r_max": 60}\n{"ring": 104, "wheel": 52}\n')
+    assert compile_file(str(source)).returncode == 0
+    output = (tmp_path / 'a.svg').read_text()
+    assert output.endswith('</svg>')
+    source.write_text('{"r_max": 60}\n{"ring": 104, "wheel": 48}\n{"ring": 104, "wheel": }\n')
+    result = compile_file(str(source))
+    assert result.returncode != 0
+    assert 'line 3:' in result.stderr
+    # the old output is kept and no temporary file is left
+    assert (tmp_path / 'a.svg').read_text() == output
+    assert sorted(os.listdir(tmp_path)) == ['a.ndjson', 'a.svg']
+
+def test_compile_ndjson_first_line_error(tmp_path):
+    source = tmp_path / 'a.ndjson'
+    source.write_text('{"ring": 104, "wheel": 52\n')
+    result = compile_file(str(source))
+    assert result.returncode != 0
+    assert 'line 1:' in result.stderr
+    assert os.listdir(tmp_path) == ['a.ndjson']
+
+def test_compile_file_error(tmp_path):
+    for name, wheel in ('a', 52), ('b', 48), ('c', 30):
+        (tmp_path / f'{name}.spiro').write_text(json.dumps([{'ring': 104, 'wheel': wheel}] * 3))
+    assert compile_file(str(tmp_path / 'c.spiro')).returncode == 0
+    expected = (tmp_path / 'c.svg').read_text()
+    os.remove(tmp_path / 'c.svg')
+    (tmp_path / 'b.svg').mkdir()
+    result = compile_file('-j', '2', *(str(tmp_path / f'{name}.spiro') for name in 'abc'))
+    assert result.returncode != 0
+    assert 'b.spiro:' in result.stderr
+    assert (tmp_path / 'a.svg').exists()
+    # the file after the failed one gets its own paths
+    assert (tmp_path / 'c.svg').read_text() == expected
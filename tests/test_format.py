@@ -0,0 +1,145 @@
+import io
+import re
+import numpy as np
+import pytest
+import xml.etree.ElementTree as etree
+import techdraw as svg
+from techdraw.gearwheel import GearWheel
+from techdraw.spirograph import Spirograph
+
+ABSOLUTE = svg.OutputFormat(precision=3)
+NUMBER = re.compile(r'[-+]?(?:\d+\.?\d*|\.\d+)(?:[eE][-+]?\d+)?')
+
+PATHS = [
+    'M 0 0 L 10 0 L 10 10 Z',
+    'M0 0 H 10 V 5 h -3 v -2 Z',
+    'M 1e1 2E-1 L 1.5e+1 -2.5e-1 l 1e0 1E0',
+    'M 0 0 C 1 1 2 2 3 3 S 5 5 6 6 Q 7 7 8 8 T 10 10 t 1 1 s 1 2 3 4',
+    'M 10 0 A 10 10 0 0 1 0 10 a 5 5 0 1 0 -5 -5 z m 20 20 l 1 1 z',
+    'm 1.2345 -2.3456 l 0.001 0.0004 l -0.0004 3.14159',
+]
+
+def commands(d):
+    '''returns the path data as list of (command, values) with absolute commands'''
+    result = []
+    for command, args in re.findall(r'([A-Za-z])([^A-Za-z]*)', ''.join(ABSOLUTE.path(d))):
+        result.append((command, [float(v) for v in NUMBER.findall(args)]))
+    return result
+
+def assert_same_path(d1, d2, tolerance):
+    c1, c2 = commands(d1), commands(d2)
+    assert [c for c, _ in c1] == [c for c, _ in c2]
+    for (_, v1), (_, v2) in zip(c1, c2):
+        assert v1 == pytest.approx(v2, abs=tolerance)
+
+@pytest.mark.parametrize('d', PATHS)
+def test_compact_round_trip(d):
+    compact = ''.join(svg.COMPACT_FORMAT.path(d))
+    assert_same_path(compact, d, 0.006)
+
+@pytest.mark.parametrize('d', PATHS)
+def test_relative_round_trip(d):
+    relative = ''.join(svg.OutputFormat(precision=3, relative=True).path(d))
+    assert relative == relative.lower()
+    assert_same_path(relative, d, 0.0006)
+
+def test_compact_generated_paths():
+    for d in (GearWheel(2, 30).svg_path(), Spirograph(105, 84, 0.6).svg_path()):
+        compact = ''.join(svg.COMPACT_FORMAT.path(d))
+        assert len(compact) < len(d)
+        assert_same_path(compact, d, 0.006)
+
+def test_chunks():
+    d = PATHS[3] + ' ' + PATHS[2] + ' L.5.5-1-2'
+    expected = ''.join(svg.COMPACT_FORMAT.path(d))
+    for i in range(1, len(d)):
+        assert ''.join(svg.COMPACT_FORMAT.path(iter([d[:i], d[i:]]))) == expected
+
+@pytest.mark.parametrize('relative', [False, True])
+def test_consecutive_movetos(relative):
+    fmt = svg.OutputFormat(precision=2, relative=relative, minify=True)
+    d = 'M 0 0 M 5 5 L 6 6 L 7 7'
+    minified = ''.join(fmt.path(d))
+    moveto = 'm' if relative else 'M'
+    assert minified.count(moveto) == 2
+    assert_same_path(minified, d, 0.006)
+
+@pytest.mark.parametrize('d', ['M 0 0 L 10 # 1', 'not a path', 'M 0 0 L 5', '10 10', 'M 0 0 Z 5'])
+def test_invalid_path_unchanged(d):
+    assert ''.join(svg.COMPACT_FORMAT.path(d)) == d
+
+def test_invalid_chunks():
+    with pytest.raises(ValueError):
+        ''.join(svg.COMPACT_FORMAT.path(iter(['M 0 0 L 5'])))
+
+def test_image_write_compact():
+    img = svg.Image((20, 20), (10, 10))
+    svg.Path(img.content, 'M0 0 H 10')
+    svg.Path(img.content, 'M 0 0 L 10 # 1')
+    f = io.StringIO()
+    img.write(f, output_format=svg.COMPACT_FORMAT)
+    assert 'd="m0 0h10"' in f.getvalue()
+    assert 'd="M 0 0 L 10 # 1"' in f.getvalue()
+
+def test_path_creator_commands():
+    p = svg.PathCreator((0, 0))
+    p.add_command('H', 10)
+    p.add_command('V', 5)
+    p.add_command('T', 1, 2)
+    assert p.path == 'M 0.000 0.000 H 10.000 V 5.000 T 1.000 2.000'
+    with pytest.raises(ValueError):
+        p.repeat_rotated(3, 1.0)
+
+@pytest.mark.parametrize('parallel', [0, np.pi])
+def test_path_creator_arc_to_almost_parallel_line(parallel):
+    expected = svg.PathCreator((0, 0)).arc_to_line((0, 10), parallel)
+    for delta in (parallel + 1e-14, parallel - 1e-14):
+        p = svg.PathCreator((0, 0)).arc_to_line((0, 10), delta)
+        assert_same_path(p.path, expected.path, 1e-9)
+        assert (p.x, p.y) == (pytest.approx(expected.x), pytest.approx(expected.y))
+
+def test_negative_precision():
+    with pytest.raises(ValueError):
+        svg.OutputFormat(precision=-1)
+    with pytest.raises(ValueError):
+        svg.OutputFormat.create(precision=-1)
+
+def escaping_image():
+    img = svg.Image((20, 20), (10, 10))
+    g = etree.SubElement(img.content, 'g', {'id': 'a&b<c>"d"\ne\tf'})
+    svg.Path(g, 'M 0 0 L 10 0', {'stroke': 'red'})
+    text = etree.SubElement(g, 'text', {'x': '1'})
+    text.text = 'x < y & "z"\n'
+    text.tail = 'tail & more'
+    etree.SubElement(g, 'text').text = '  '
+    outer = etree.SubElement(img.content, 'g')
+    outer.text = 'inner text'
+    etree.SubElement(outer, 'circle', {'r': '1'}).tail = '\n  '
+    return img
+
+@pytest.mark.parametrize('indent', ['    ', '  ', None])
+def test_image_write_like_etree(indent):
+    tree = etree.ElementTree(escaping_image())
+    if indent is not None:
+        etree.indent(tree, indent)
+    expected = io.StringIO()
+    tree.write(expected, encoding='unicode')
+    f = io.StringIO()
+    escaping_image().write(f, indent=indent, buffer_size=7)
+    assert f.getvalue() == expected.getvalue()
+
+def test_fmt_values_like_fmt_f():
+    rng = np.random.default_rng(3)
+    values = np.concatenate((rng.uniform(-1000, 1000, 500), rng.normal(0, 1e-3, 100),
+                             [0.0, -0.0, -0.0004, 0.0005, -0.0005, 1e15, -1e20, 123456789.0125, 2.5e-7, 999.9995]))
+    expected = [svg.fmt_f(v) for v in values]
+    assert svg.fmt_values(values) == expected
+    assert svg.fmt_array(values) == ' '.join(expected)
+    assert svg.fmt_array(values.reshape(-1, 2)) == svg.fmt_f(*values)
+    assert svg.fmt_array(values, sep=',') == ','.join(expected)
+
+def test_fmt_values_trim():
+    values = [1.0, 1.5, -0.0, -0.0001, 100.0, 0.125, -2.1004, 1e20]
+    assert svg.fmt_values(values, trim=True) == ['1', '1.5', '0', '0', '100', '0.125', '-2.1', '100000000000000000000']
+    assert svg.fmt_array(values, precision=1, trim=True) == '1 1.5 0 0 100 0.1 -2.1 100000000000000000000'
+    assert svg.fmt_values([1.25, -0.0], precision=0, trim=True) == ['1', '0']
@@ -0,0 +1,60 @@
+import math
+import numpy as np
+import pytest
+import techdraw as svg
+
+def random_lines(n, seed=1):
+    rng = np.random.default_rng(seed)
+    return rng.uniform(-10, 10, (6, n))
+
+def test_intersections_r():
+    x0, y0, alpha0, x1, y1, alpha1 = random_lines(200)
+    r0, r1 = svg.intersections_r(x0, y0, alpha0, x1, y1, alpha1)
+    for i in range(200):
+        expected = svg.intersection_r(x0[i], y0[i], alpha0[i], x1[i], y1[i], alpha1[i])
+        assert (r0[i], r1[i]) == pytest.approx(expected, rel=1e-9, abs=1e-9)
+
+def test_intersections_r_broadcast():
+    *_, x1, y1, alpha1 = random_lines(20)
+    r0, r1 = svg.intersections_r(0, 0, 0.5, x1, y1, alpha1)
+    assert r0.shape == r1.shape == (20,)
+    assert r0[3] == pytest.approx(svg.intersection_r(0, 0, 0.5, x1[3], y1[3], alpha1[3])[0])
+
+def test_intersections_r_parallel():
+    alpha1 = np.array([0.3, 0.3 + math.pi, 1.0])
+    r0, r1 = svg.intersections_r(0, 0, 0.3, [1, 1, 1], [2, 2, 2], alpha1)
+    assert np.isnan(r0[:2]).all() and np.isnan(r1[:2]).all()
+    assert not np.isnan(r0[2])
+    for alpha in alpha1[:2]:
+        with pytest.raises(ValueError):
+            svg.intersection_r(0, 0, 0.3, 1, 2, alpha)
+
+def test_intersection_points():
+    x0, y0, alpha0, x1, y1, alpha1 = random_lines(50)
+    alpha1[0] = alpha0[0] # parallel
+    points = svg.intersection_points(x0, y0, alpha0, x1, y1, alpha1)
+    assert points.shape == (50, 2)
+    assert np.isnan(points[0]).all()
+    for i in range(1, 50):
+        expected = svg.intersection_xy(x0[i], y0[i], alpha0[i], x1[i], y1[i], alpha1[i])
+        assert tuple(points[i]) == pytest.approx(expected, rel=1e-9, abs=1e-9)
+
+def test_curves_to():
+    rng = np.random.default_rng(2)
+    points = rng.uniform(-10, 10, (30, 2))
+    angles = rng.uniform(0, 2 * math.pi, 30)
+    expected = svg.PathCreator((1, 2), 0.5)
+    for point, alpha in zip(points, angles):
+        expected.curve_to(tuple(point), alpha)
+    p = svg.PathCreator((1, 2), 0.5).curves_to(points, angles)
+    assert np.allclose(np.asarray(p.coords), np.asarray(expected.coords))
+    assert p.path == expected.path
+    assert (p.x, p.y, p.alpha) == (expected.x, expected.y, expected.alpha)
+
+def test_curves_to_errors():
+    p = svg.PathCreator((0, 0))
+    with pytest.raises(ValueError):
+        p.curves_to([(1, 1), (2, 2)], [0.5])
+    with pytest.raises(ValueError):
+        p.curves_to([(1, 1), (2, 3)], [0.0, 0.0]) # tangents parallel to the start
+    assert p.path == 'M 0.000 0.000'
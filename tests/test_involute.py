@@ -0,0 +1,32 @@
+import math
+import numpy as np
+import pytest
+from techdraw.involute import inverse, involute_function, inverse_involute_function, InverseTable
+
+def test_inverse():
+    assert inverse(10, 20) == pytest.approx(math.sqrt(3))
+    with pytest.raises(ValueError):
+        inverse(10, 5)
+    with np.errstate(invalid='ignore'):
+        result = inverse(10, np.array([5, 10, 20]))
+    assert np.isnan(result[0])
+    assert np.allclose(result[1:], [0, math.sqrt(3)])
+
+def test_inverse_involute_function():
+    phi = np.linspace(0, math.radians(75), 50)
+    assert np.allclose(inverse_involute_function(involute_function(phi)), phi)
+
+def test_inverse_involute_function_scalar():
+    phi = math.radians(20)
+    assert inverse_involute_function(involute_function(phi)) == pytest.approx(phi)
+
+def test_inverse_involute_function_start_array():
+    phi = np.linspace(0.1, 1.0, 10)
+    result = inverse_involute_function(involute_function(0.5), phi=phi + 0.2)
+    assert result.shape == phi.shape
+    assert np.allclose(result, 0.5)
+
+def test_inverse_table():
+    table = InverseTable(iterations=2)
+    phi = np.linspace(0, math.radians(70), 50)
+    assert np.allclose(table(involute_function(phi)), phi)
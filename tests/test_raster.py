@@ -0,0 +1,64 @@
+import io
+import numpy as np
+import pytest
+import xml.etree.ElementTree as etree
+import techdraw as svg
+from techdraw import raster
+from techdraw.gearwheel import GearWheel
+from techdraw.spirograph import Spirograph
+from techdraw.spirograph.compile import image
+
+def polylines(d, tolerance=0.01):
+    return [(points.tolist(), closed) for points, closed in raster.path_polylines(d, tolerance)]
+
+def test_moveto():
+    assert polylines('M 0 0 10 0 10 10') == [([[0, 0], [10, 0], [10, 10]], False)]
+    assert polylines('m 1 1 10 0 0 10') == [([[1, 1], [11, 1], [11, 11]], False)]
+
+def test_lines():
+    assert polylines('M 0 0 H 10 V 10 h -10 Z') == [([[0, 0], [10, 0], [10, 10], [0, 10]], True)]
+    assert polylines('M 0 0 L 10 0 Z m 5 5 l 1 0') == [([[0, 0], [10, 0]], True), ([[5, 5], [6, 5]], False)]
+
+def test_exponents():
+    assert polylines('M 0 0 L 1e1 0 l 0 1E1 L 5e-1 -2.5E+0') == [([[0, 0], [10, 0], [10, 10], [0.5, -2.5]], False)]
+
+def test_smooth_curves():
+    [(cubic, _)] = polylines('M 0 0 C 0 1 1 1 1 0 S 2 -1 2 0', 0.5)
+    [(reflected, _)] = polylines('M 0 0 C 0 1 1 1 1 0 C 1 -1 2 -1 2 0', 0.5)
+    assert cubic == reflected
+    [(quadratic, _)] = polylines('M 0 0 Q 1 1 2 0 T 4 0 t 2 0', 0.5)
+    [(reflected, _)] = polylines('M 0 0 Q 1 1 2 0 Q 3 -1 4 0 Q 5 1 6 0', 0.5)
+    assert quadratic == reflected
+    # without a preceding curve the control point is the current point
+    assert polylines('M 0 0 T 2 0', 0.5) == polylines('M 0 0 Q 0 0 2 0', 0.5)
+
+def test_arc_tolerance():
+    [(points, _)] = polylines('M 10 0 A 10 10 0 0 1 -10 0', 0.01)
+    r = np.hypot(*np.array(points).T)
+    assert np.allclose(r, 10)
+    assert points[-1] == [-10, 0]
+
+def test_square_pixels():
+    root = etree.fromstring('<svg xmlns="http://www.w3.org/2000/svg" viewBox="0 0 8 8">'
+                            '<path d="M 2 2 h 4 v 4 h -4 z" fill="black"/></svg>')
+    pixels = raster.rasterize(root, size=8)[..., 0]
+    expected = np.full((8, 8), 255)
+    expected[2:6, 2:6] = 0
+    assert pixels.tolist() == expected.tolist()
+
+def written(img, output_format=None):
+    f = io.StringIO()
+    img.write(f, output_format=output_format)
+    return etree.fromstring(f.getvalue())
+
+@pytest.mark.parametrize('img', [
+    GearWheel(2, 30).svg_image(),
+    image('spirograph', [(Spirograph(105, 84, 0.6), {})], [Spirograph(105, 84, 0.6).svg_path()]),
+], ids=['gearwheel', 'spirograph'])
+def test_compact_pixels(img):
+    absolute = raster.rasterize(written(img), size=256)
+    compact = raster.rasterize(written(img, svg.OutputFormat(precision=3, relative=True, minify=True)), size=256)
+    assert np.array_equal(compact, absolute)
+    rounded = raster.rasterize(written(img, svg.COMPACT_FORMAT), size=256)
+    # rounding to 2 decimals moves edges by up to 0.005 mm, which flips single samples
+    assert np.abs(rounded.astype(int) - absolute).mean() < 0.5
@@ -0,0 +1,89 @@
+import json
+import time
+import asyncio
+import pytest
+from http import HTTPStatus
+from concurrent.futures import ProcessPoolExecutor
+from techdraw import server
+
+def slow(seconds, output_format=None):
+    time.sleep(seconds)
+    return b'<svg/>'
+
+def status(parse, body):
+    with pytest.raises(server.HTTPError) as error:
+        parse(json.dumps(body))
+    return error.value.status
+
+def test_max_revolutions():
+    assert status(server.parse_spirograph, {'ring': 997, 'wheel': 150}) == HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+    key, _, (data,) = server.parse_spirograph(json.dumps({'ring': 997, 'wheel': 150, 'max_revolutions': server.MAX_REVOLUTIONS}))
+    [(spirograph, _)] = data
+    assert spirograph.revolutions() == server.MAX_REVOLUTIONS
+    assert not spirograph.closed()
+    assert json.loads(key)[1][0][0]['max_revolutions'] == server.MAX_REVOLUTIONS
+
+@pytest.mark.parametrize('body', [
+    {'ring': 105, 'wheel': 84, 'max_revolutions': server.MAX_REVOLUTIONS + 1},
+    {'ring': server.MAX_TEETH + 1, 'wheel': 84},
+    {'ring': 105, 'wheel': -server.MAX_TEETH - 1},
+    {'ring': 105, 'wheel': 84, 'samples': server.MAX_SAMPLES + 1},
+    {'ring': 105, 'wheel': 84, 'tolerance': server.MIN_TOLERANCE / 2},
+    [{'ring': 105, 'wheel': 84}] * (server.MAX_SPIROGRAPHS + 1),
+    [{'ring': 1999, 'wheel': 1000, 'samples': 64}] * 10,
+])
+def test_spirograph_limits(body):
+    assert status(server.parse_spirograph, body) == HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+
+@pytest.mark.parametrize('body', [
+    {'ring': 105, 'wheel': 50, 'stroke-width': 0.3},
+    [{'ring': 105, 'wheel': 50}, {'ring': 105, 'wheel': 48, 'stroke': None}],
+])
+def test_spirograph_attributes(body):
+    with pytest.raises(ValueError):
+        server.parse_spirograph(json.dumps(body))
+
+def test_gearwheel_limits():
+    server.parse_gearwheel(json.dumps({'modul': 1, 'teeth': server.MAX_TEETH}))
+    assert status(server.parse_gearwheel, {'modul': 1, 'teeth': server.MAX_TEETH + 1}) == HTTPStatus.REQUEST_ENTITY_TOO_LARGE
+
+def test_timeout():
+    async def render(render_server):
+        result, render = await render_server.render('fast', slow, (0,))
+        assert (result, render) == (b'<svg/>', 'rendered')
+        with pytest.raises(server.HTTPError) as error:
+            await render_server.render('slow', slow, (5,))
+        assert error.value.status == HTTPStatus.SERVICE_UNAVAILABLE
+        assert 'slow' not in render_server.responses
+
+    with ProcessPoolExecutor(max_workers=1, initializer=server.worker) as pool:
+        start = time.monotonic()
+        asyncio.run(render(server.RenderServer(pool, timeout=0.5)))
+        # the worker aborted the job, it is free for the next one
+        assert pool.submit(slow, 0).result(timeout=2) == b'<svg/>'
+        assert time.monotonic() - start < 3
+
+class Writer:
+    def __init__(self):
+        self.data = bytearray()
+
+    def write(self, data):
+        self.data += data
+
+    async def drain(self):
+        pass
+
+@pytest.mark.parametrize('length', ['abc', '-5'])
+def test_invalid_content_length(length):
+    async def request():
+        reader = asyncio.StreamReader()
+        reader.feed_data(f'Content-Length: {length}\r\n\r\nGET /metrics HTTP/1.1\r\n\r\n'.encode('latin-1'))
+        reader.feed_eof()
+        writer = Writer()
+        keep_alive = await server.RenderServer(None).request(b'POST /spirograph HTTP/1.1\r\n', reader, writer)
+        return keep_alive, bytes(writer.data)
+
+    keep_alive, response = asyncio.run(request())
+    assert not keep_alive
+    assert response.startswith(b'HTTP/1.1 400 ')
+    assert b'Connection: close' in response
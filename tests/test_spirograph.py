@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+from techdraw.spirograph import Spirograph
+
+def max_chord_deviation(spirograph, angles, samples=64):
+    '''returns the largest distance of the curve from the chords of the path, measured densely'''
+    ends = np.append(angles, spirograph.total_angle())
+    a, b = ends[:-1], ends[1:]
+    p, q = spirograph.pen_positions(a), spirograph.pen_positions(b)
+    d = q - p
+    dd = np.maximum((d * d).sum(axis=1), 1e-300)
+    result = 0.0
+    for t in np.linspace(0, 1, samples + 1)[1:-1]:
+        w = spirograph.pen_positions(a + t * (b - a)) - p
+        u = np.clip((w * d).sum(axis=1) / dd, 0, 1)
+        result = max(result, np.hypot(*(w - u[:, np.newaxis] * d).T).max())
+    return result
+
+@pytest.mark.parametrize('ring, wheel, excenter, offset', [
+    (60, 7, 1.0, 0), (60, 7, 0.98, 0), (90, -12, 1.0, 0), (96, 41, 1.0, 3), (105, -50, 0.999, 5), (105, 84, 0.8, 0),
+])
+@pytest.mark.parametrize('tolerance', [0.01, 0.1, 0.5])
+def test_adaptive_angles_tolerance(ring, wheel, excenter, offset, tolerance):
+    spirograph = Spirograph(ring, wheel, excenter, offset, tolerance=tolerance)
+    assert max_chord_deviation(spirograph, spirograph.adaptive_angles(tolerance)) <= tolerance
+
+def test_adaptive_angles_open_spirograph():
+    spirograph = Spirograph(97, 96, 1.0, tolerance=0.05, max_revolutions=2)
+    assert not spirograph.closed()
+    assert max_chord_deviation(spirograph, spirograph.adaptive_angles(0.05)) <= 0.05
+
+def max_bezier_deviation(spirograph, angles, samples=64):
+    '''returns the largest distance of the Bézier segments from the curve at the same parameter, measured densely'''
+    p0, p1, p2, p3 = spirograph.bezier_ctrl_points(angles)
+    result = 0.0
+    for t in np.linspace(0, 1, samples + 1)[1:-1]:
+        u = 1 - t
+        b = u**3 * p0 + 3 * u * u * t * p1 + 3 * u * t * t * p2 + t**3 * p3
+        q = spirograph.pen_positions(angles[:-1] + t * np.diff(angles))
+        result = max(result, np.hypot(*(b - q).T).max())
+    return result
+
+@pytest.mark.parametrize('ring, wheel, excenter, offset', [
+    (60, 7, 1.0, 0), (60, 7, 0.98, 0), (90, -12, 1.0, 0), (96, 41, 1.0, 3), (105, -50, 0.999, 5), (105, 84, 0.8, 0),
+])
+@pytest.mark.parametrize('tolerance', [0.01, 0.1, 0.5])
+def test_bezier_angles_tolerance(ring, wheel, excenter, offset, tolerance):
+    spirograph = Spirograph(ring, wheel, excenter, offset, tolerance=tolerance, curves=True)
+    angles = spirograph.bezier_angles(tolerance)
+    assert angles[0] == 0 and angles[-1] == pytest.approx(spirograph.total_angle())
+    assert max_bezier_deviation(spirograph, angles) <= tolerance
+
+def test_cusp_angles():
+    spirograph = Spirograph(60, 7, 1.0, offset=3)
+    d1, _ = spirograph.derivatives(spirograph.cusp_angles())
+    assert len(d1) == 60
+    assert np.hypot(d1[:, 0], d1[:, 1]).max() < 1e-9
+
+def test_period():
+    assert Spirograph(10007, 3).revolutions() == 3
+    assert len(Spirograph(105, 50)) == 105 * 10
+    assert Spirograph(10007, 10006, max_revolutions=5).step_count() == 5 * 10007